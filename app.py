@@ -1,30 +1,13 @@
 
 import streamlit as st
-import mercadopago
 import time
-import subprocess
-import sys
 
+from modules.auth_google import login_required, render_user_info, check_subscription_status, refresh_subscription_status, is_admin
+from modules.page_registry import run_page
+from modules.yt_dlp_updater import schedule_upgrade
 
-try:
-    subprocess.run([sys.executable, "-m", "pip", "install", "--upgrade", "yt-dlp"], check=True)
-except subprocess.CalledProcessError as e:
-    print(f"Error updating yt-dlp: {e}")
-
-from modules.auth_google import login_required, render_user_info, check_subscription_status
-
-# Importar funciones de páginas
-from page.YouTube.Links_YouTube import run_links_youtube_page
-from page.YouTube.Data_Base import run_data_base_page
-from page.YouTube.Channel_YouTube import run_channel_youtube_page
-from page.Fulcrum.Piston.piston import run_piston_page
-from page.Fulcrum.Angles.composerToTimelineJson import run_composer_to_timeline_page
-from page.Longo_Match.xmltocsvjson import run_xml_to_csv_json_page
-from page.YouTube.Playlist_YouTube import run_playlist_youtube_page
-from page.YouTube.Download_Playlist import run_download_playlist_page
-from page.DEMO.Data_Base_Demo import run_data_base_demo_page
-from page.Fulcrum.Angles.Angle_Tabla_filter import run_angle_tabla_filter_page
-from page.SPORTCODE.sportcode_to_json import run_sportcode_to_json_page
+# Actualiza yt-dlp en segundo plano como máximo una vez por TTL; nunca bloquea el login.
+schedule_upgrade()
 
 st.set_page_config(page_title="Data App", layout="wide")
 
@@ -39,28 +22,58 @@ login_required()
 
 # --- 3. DEFINICIÓN DE PÁGINAS ---
 
+PAYMENT_WAIT_SECONDS = 60 # Tiempo máximo esperando la activación tras el pago
+PAYMENT_WAIT_TICK_SECONDS = 2 # Cada cuánto el fragmento mira el estado (en memoria)
+
+def _on_payment_activated():
+    st.success("¡Tu acceso ha sido activado con éxito!")
+    st.balloons()
+    time.sleep(2)
+    st.session_state.current_page = 'home'
+    st.session_state.payment_initiated = False
+    st.session_state.payment_wait_deadline = None
+    st.session_state.payment_wait_expired = False
+    st.rerun()
+
+@st.fragment(run_every=PAYMENT_WAIT_TICK_SECONDS)
+def render_payment_wait_status():
+    """
+    Espera la activación sin ocupar un hilo del servidor: entre ticks no corre nada, y cada
+    tick solo lee la caché de suscripciones, que el webhook actualiza vía change stream.
+    """
+    if st.session_state.payment_wait_deadline is None:
+        return
+    if check_subscription_status(st.user.email) == "active":
+        _on_payment_activated()
+    elif time.time() < st.session_state.payment_wait_deadline:
+        st.info("⏳ Verificando tu pago, por favor espera...")
+    else:
+        # Se vence la espera: la página completa muestra el aviso y deja de dibujar el fragmento
+        st.session_state.payment_wait_deadline = None
+        st.session_state.payment_wait_expired = True
+        st.rerun()
+
 def show_payment_page():
     st.title("Suscripción Requerida")
 
     if st.session_state.payment_initiated:
         st.info("Si ya has completado el pago, haz clic en el botón de abajo para verificar tu suscripción.")
         if st.button("✅ Ya completé mi pago, verificar ahora", use_container_width=True, type="primary"):
-            with st.spinner("Verificando tu pago, por favor espera..."):
-                for i in range(20):
-                    if check_subscription_status(st.user.email) == "active":
-                        st.success("¡Tu acceso ha sido activado con éxito!")
-                        st.balloons()
-                        time.sleep(2)
-                        st.session_state.current_page = 'home'
-                        st.session_state.payment_initiated = False
-                        st.rerun()
-                        return
-                    time.sleep(3)
+            # Una sola lectura a Mongo; después se espera la notificación del webhook sin bloquear hilos.
+            if refresh_subscription_status(st.user.email) == "active":
+                _on_payment_activated()
+            st.session_state.payment_wait_deadline = time.time() + PAYMENT_WAIT_SECONDS
+            st.session_state.payment_wait_expired = False
+        if st.session_state.get("payment_wait_deadline"):
+            render_payment_wait_status()
+        elif st.session_state.get("payment_wait_expired"):
             st.error("Aún no hemos recibido la confirmación de tu pago.")
             st.warning("A veces puede tardar uno o dos minutos. Por favor, inténtalo de nuevo en un momento.")
         st.divider()
         if st.button("Volver a intentar el pago"):
             st.session_state.payment_initiated = False
+            st.session_state.payment_wait_deadline = None
+            st.session_state.payment_wait_expired = False
             st.rerun()
     else:
         st.markdown("### Para acceder a esta herramienta, necesitas una suscripción activa.")
@@ -78,6 +91,7 @@ def show_payment_page():
                 """)
             if st.button("Entendido, ir a Pagar con Mercado Pago", use_container_width=True, type="primary"):
                 st.session_state.payment_initiated = True
+                import mercadopago  # Solo se necesita al crear la preferencia de pago
                 sdk = mercadopago.SDK(st.secrets["MERCADOPAGO_ACCESS_TOKEN"])
                 preference_data = {
                     "items": [{"title": "Suscripción Mensual", "quantity": 1, "unit_price": 2500, "currency_id": "ARS"}],
@@ -98,9 +112,7 @@ def handle_free_card_click(page_name):
     st.session_state.current_page = page_name
 
 def handle_paid_card_click(page_name):
-    is_admin = st.user.email in st.secrets.get("ADMINS", [])
-    is_subscribed = check_subscription_status(st.user.email) == "active"
-    if is_admin or is_subscribed:
+    if is_admin(st.user.email) or check_subscription_status(st.user.email) == "active":
         st.session_state.current_page = page_name
     else:
         st.session_state.current_page = "payment"
@@ -236,31 +248,12 @@ def show_main_app():
 
     elif st.session_state.current_page == "payment":
         show_payment_page()
-    elif st.session_state.current_page == "youtube_database":
-        run_data_base_page()
-    elif st.session_state.current_page == "youtube_database_demo":
-        run_data_base_demo_page()
-    elif st.session_state.current_page == "youtube_links":
-        run_links_youtube_page()
-    elif st.session_state.current_page == "youtube_channel":
-        run_channel_youtube_page()
-    elif st.session_state.current_page == "longo_match":
-        run_xml_to_csv_json_page()
-    
-    elif st.session_state.current_page == "fulcrum_angles":
-        run_composer_to_timeline_page(st.user.name)
-    elif st.session_state.current_page == "fulcrum_angles_tabla_filter":
-        run_angle_tabla_filter_page()
-    elif st.session_state.current_page == "piston_hls":
-        run_piston_page()
-    elif st.session_state.current_page == "playlist_youtube":
-        run_playlist_youtube_page()
-  
-    elif st.session_state.current_page == "sportcode_to_json":
-        run_sportcode_to_json_page()
-
+    else:
+        # Las páginas se importan bajo demanda desde el registro (modules/page_registry.py)
+        if not run_page(st.session_state.current_page, user_name=getattr(st.user, "name", None)):
+            st.session_state.current_page = "home"
+            st.rerun()
 
-    
 
 # --- 5. EJECUCIÓN PRINCIPAL ---
 show_main_app()
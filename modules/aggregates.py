@@ -0,0 +1,114 @@
+# aggregates.py
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+CUBE_DIMENSIONS = ["EQUIPO", "Row Name", "RESULTADO", "FORM", "JUGADOR"]
+COUNTS_CACHE_MAX_ENTRIES = 64
+
+# Marcas derivadas que usan los gráficos, calculadas sobre las celdas y no sobre las filas
+LINEOUT_PATTERN = "LINEOUT"
+WIN_PATTERN = "GANO|WIN"
+
+
+class AggregateCube:
+    """
+    Cubo de conteos sobre las dimensiones clave de un DataFrame de clips.
+
+    Al construirlo, cada fila se asigna a una celda (combinación distinta de EQUIPO, Row Name,
+    RESULTADO, FORM y JUGADOR). Un estado de filtros se resuelve con un único `bincount` de
+    las celdas de las filas filtradas; después cada gráfico agrupa la tabla de celdas, que
+    es chica, en vez de recorrer el DataFrame.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._counts = OrderedDict()
+        self._build()
+
+    def _build(self):
+        self.dimensions = [dim for dim in CUBE_DIMENSIONS if dim in self.df.columns]
+        if not self.dimensions:
+            self.cells = pd.DataFrame(index=pd.RangeIndex(1))
+            self._row_cell = np.zeros(len(self.df), dtype=np.intp)
+            return
+
+        codes, uniques = [], []
+        for dim in self.dimensions:
+            dim_codes, dim_uniques = pd.factorize(self.df[dim], use_na_sentinel=True)
+            codes.append(dim_codes)
+            uniques.append(dim_uniques)
+        # Una clave entera por fila (base mixta); el código -1 (faltante) pasa a 0
+        shape = tuple(len(dim_uniques) + 1 for dim_uniques in uniques)
+        flat = np.ravel_multi_index([dim_codes + 1 for dim_codes in codes], shape)
+        row_cell, cell_keys = pd.factorize(flat, sort=True)
+        self._row_cell = row_cell
+        cell_codes = np.unravel_index(cell_keys, shape)
+
+        columns = {}
+        for i, dim in enumerate(self.dimensions):
+            values = np.concatenate([[np.nan], np.asarray(uniques[i], dtype=object)])
+            columns[dim] = values[cell_codes[i]]
+        self.cells = pd.DataFrame(columns)
+        if "Row Name" in self.cells:
+            self.cells["_lineout"] = self.cells["Row Name"].str.contains(LINEOUT_PATTERN, case=False, na=False)
+        if "RESULTADO" in self.cells:
+            self.cells["_win"] = self.cells["RESULTADO"].str.contains(WIN_PATTERN, case=False, na=False)
+
+    def has(self, *dimensions) -> bool:
+        return all(dim in self.dimensions for dim in dimensions)
+
+    def counts(self, positions: np.ndarray, key) -> np.ndarray:
+        """Filas filtradas por celda, memoizado por la clave del estado de filtros."""
+        cached = self._counts.get(key)
+        if cached is not None:
+            self._counts.move_to_end(key)
+            return cached
+        counts = np.bincount(self._row_cell[positions], minlength=len(self.cells))
+        self._counts[key] = counts
+        while len(self._counts) > COUNTS_CACHE_MAX_ENTRIES:
+            self._counts.popitem(last=False)
+        return counts
+
+    def _slice(self, counts, where):
+        cells = self.cells.assign(_n=counts)
+        mask = cells["_n"] > 0
+        for flag in where:
+            mask &= cells[flag]
+        return cells[mask]
+
+    def pivot(self, counts, rows: str, columns: str, where=()) -> pd.DataFrame:
+        """Equivalente a `df.groupby([rows, columns]).size().unstack(fill_value=0)`."""
+        cells = self._slice(counts, where)
+        return cells.groupby([rows, columns])["_n"].sum().unstack(fill_value=0)
+
+    def value_counts(self, counts, dimension: str, where=()) -> pd.Series:
+        """Equivalente a `df[dimension].value_counts()`."""
+        cells = self._slice(counts, where)
+        result = cells.groupby(dimension)["_n"].sum().sort_values(ascending=False, kind="stable")
+        return result.rename("count")
+
+    def total(self, counts, where=()) -> int:
+        return int(self._slice(counts, where)["_n"].sum())
+
+    def nbytes(self) -> int:
+        total = int(self.cells.memory_usage(deep=True).sum()) + self._row_cell.nbytes
+        return total + sum(counts.nbytes for counts in self._counts.values())
+
+    def invalidate(self, columns=None):
+        """Tras editar celdas: se reconstruye si cambió una dimensión y se descartan los conteos."""
+        if columns is None or any(col in CUBE_DIMENSIONS for col in columns):
+            self._build()
+        self._counts.clear()
+
+
+def get_aggregate_cube(df: pd.DataFrame) -> AggregateCube:
+    """Cubo de la sesión; se reconstruye solo cuando cambia el DataFrame cargado."""
+    cube = st.session_state.get("aggregate_cube")
+    if cube is None or cube.df is not df:
+        cube = AggregateCube(df)
+        st.session_state.aggregate_cube = cube
+    return cube
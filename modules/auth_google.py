@@ -1,13 +1,29 @@
 # auth.py
 
 import streamlit as st
-from pymongo import MongoClient
 import datetime
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from modules.db import get_database
+from modules.event_buffer import EventBuffer
+from modules.subscription_events import SubscriptionWatcher
+
+# --- Caché de suscripciones ---
+SUBSCRIPTION_CACHE_TTL_SECONDS = 300 # Vida máxima de una entrada aunque no haya cambios
+SUBSCRIPTION_CACHE_MAX_ENTRIES = 10000 # Tope del LRU (una entrada por email)
+SUBSCRIPTION_SYNC_INTERVAL_SECONDS = 5 # Intervalo de consulta si Mongo no soporta change streams
+
+# --- Buffer de eventos de login ---
+LOGIN_EVENTS_BATCH_SIZE = 200
+LOGIN_EVENTS_FLUSH_SECONDS = 2.0
+LOGIN_EVENTS_MAX_QUEUE = 10000
 
 # Conexión a MongoDB
 try:
-    client = MongoClient(st.secrets["MONGO_URI"])
-    db = client.login_logs # Nombre de la base de datos
+    db = get_database() # Cliente compartido por proceso (modules/db.py)
     login_collection = db.saas_dbvideo # Colección para registrar inicios de sesión
     suscripciones_collection = db.suscripciones # NUEVA COLECCIÓN para manejar suscripciones
 except Exception as e:
@@ -36,24 +52,35 @@ def render_user_info():
     with col2:
         st.subheader(getattr(st.user, 'name', 'Usuario'))
     st.caption(getattr(st.user, 'email', ''))
+    if is_admin(getattr(st.user, 'email', None)):
+        stats = get_login_event_buffer().stats()
+        st.caption(
+            f"Eventos: {stats['queued']} encolados · {stats['flushed']} escritos · "
+            f"{stats['dropped']} descartados · {stats['pending']} pendientes"
+        )
     st.button("🏃‍♂️‍➡️ Cerrar sesión", on_click=st.logout)
 
+@st.cache_resource(show_spinner=False)
+def get_login_event_buffer():
+    """Buffer de eventos de uso compartido por todas las sesiones del proceso."""
+    return EventBuffer(
+        login_collection,
+        max_queue=LOGIN_EVENTS_MAX_QUEUE,
+        batch_size=LOGIN_EVENTS_BATCH_SIZE,
+        flush_interval=LOGIN_EVENTS_FLUSH_SECONDS,
+    )
+
 def _log_login_event(user_email):
     # Solo registrar el evento de login una vez por sesión.
     if "login_event_logged" not in st.session_state:
-        try:
-            login_data = {
-                "timestamp": datetime.datetime.now(),
-                "user_email": user_email
-            }
-            login_collection.insert_one(login_data)
-            st.session_state['db_log_status'] = "Success"
-        except Exception as e:
-            st.session_state['db_log_status'] = "Error"
-            st.session_state['db_log_error'] = str(e)
-        finally:
-            # Marcar que el intento de log ya se hizo, para no repetirlo.
-            st.session_state["login_event_logged"] = True
+        # Se encola y lo escribe un hilo en segundo plano: Mongo no suma latencia al primer render.
+        queued = get_login_event_buffer().enqueue({
+            "timestamp": datetime.datetime.now(),
+            "user_email": user_email
+        })
+        st.session_state['db_log_status'] = "Queued" if queued else "Dropped"
+        # Marcar que el intento de log ya se hizo, para no repetirlo.
+        st.session_state["login_event_logged"] = True
 
 def _show_login_screen():
     st.markdown("""
@@ -68,6 +95,78 @@ def _show_login_screen():
     st.subheader("Iniciá sesión con Google para continuar.")
     st.button("➡️ Iniciar sesión con Google", on_click=st.login, type="primary")
 
+class SubscriptionCache:
+    """
+    LRU acotado con TTL por entrada, compartido por todas las sesiones del proceso.
+    Guarda el estado de suscripción ("active"/"inactive") indexado por email.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # email -> (status, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_email):
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(user_email, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_email)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_email, status):
+        with self._lock:
+            self._entries[user_email] = (status, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_email=None):
+        with self._lock:
+            if user_email is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_email, None)
+
+
+_subscription_cache = SubscriptionCache(SUBSCRIPTION_CACHE_MAX_ENTRIES, SUBSCRIPTION_CACHE_TTL_SECONDS)
+
+def _on_subscription_change(user_email, status):
+    _subscription_cache.set(user_email, status)
+
+@st.cache_resource(show_spinner=False)
+def get_subscription_watcher():
+    """
+    Watcher único por proceso que mantiene la caché al día con los cambios que escribe el
+    webhook (change stream de Mongo o, si no está disponible, consulta por `updated_at`).
+    """
+    return SubscriptionWatcher(
+        suscripciones_collection, _on_subscription_change, poll_interval=SUBSCRIPTION_SYNC_INTERVAL_SECONDS
+    ).start()
+
+def _parse_email_list(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return frozenset(email.strip() for email in value if email and email.strip())
+
+@functools.lru_cache(maxsize=1)
+def _allowed_users():
+    """Usuarios con acceso gratuito (secreto ALLOWED_USERS), parseados una sola vez por proceso."""
+    return _parse_email_list(st.secrets.get("ALLOWED_USERS", ""))
+
+@functools.lru_cache(maxsize=1)
+def _admins():
+    return _parse_email_list(st.secrets.get("ADMINS", []))
+
+def is_admin(user_email):
+    return user_email in _admins()
+
 def grant_subscription(user_email):
     """Otorga una suscripción activa a un usuario en la colección 'suscripciones'."""
     try:
@@ -80,6 +179,7 @@ def grant_subscription(user_email):
                     "payment_date": datetime.datetime.now(),
                     "source": "mercadopago"
                 },
+                "$currentDate": {"updated_at": True},
                 "$setOnInsert": {
                     "user_email": user_email,
                     "signup_date": datetime.datetime.now()
@@ -87,6 +187,7 @@ def grant_subscription(user_email):
             },
             upsert=True
         )
+        _subscription_cache.set(user_email, "active")
         return True
     except Exception as e:
         st.error(f"Error al actualizar la base de datos: {e}")
@@ -94,19 +195,23 @@ def grant_subscription(user_email):
 
 def check_subscription_status(user_email):
     """Verifica si un usuario tiene una suscripción activa o está en la lista de permitidos."""
-    
+
     # 1. Verificar si el usuario está en la lista de acceso gratuito
-    allowed_users_str = st.secrets.get("ALLOWED_USERS", "")
-    allowed_users = [email.strip() for email in allowed_users_str.split(",")]
-    
-    if user_email in allowed_users:
+    if user_email in _allowed_users():
         return "active" # Acceso concedido para usuarios en la lista
 
-    # 2. Si no está en la lista, verificar su estado en la colección 'suscripciones'
-    # Se busca en la nueva colección
-    suscripcion = suscripciones_collection.find_one({"user_email": user_email})
-    if suscripcion and suscripcion.get("status") == "active":
-        return "active"
-    
-    # 3. Si no cumple ninguna condición, no tiene acceso
-    return "inactive"
\ No newline at end of file
+    # 2. Consultar la caché del proceso (refrescada con los cambios que escribió el webhook)
+    get_subscription_watcher()
+    status = _subscription_cache.get(user_email)
+    if status is not None:
+        return status
+
+    # 3. Si no está en caché, verificar su estado en la colección 'suscripciones'
+    return refresh_subscription_status(user_email)
+
+def refresh_subscription_status(user_email):
+    """Lee el estado directamente de Mongo (una sola consulta) y actualiza la caché."""
+    suscripcion = suscripciones_collection.find_one({"user_email": user_email}, {"status": 1})
+    status = "active" if suscripcion and suscripcion.get("status") == "active" else "inactive"
+    _subscription_cache.set(user_email, status)
+    return status
@@ -0,0 +1,144 @@
+# clip_ingest.py
+
+import csv
+import hashlib
+import io
+from typing import Optional
+
+import pandas as pd
+import streamlit as st
+
+from modules.frame_memory import compact_dtypes
+from modules.youtube_urls import extraer_video_ids
+
+# Nombres estándar de columnas y sus alias posibles en los CSV exportados (minúsculas).
+COLUMN_MAPPING = {
+    'Row Name': ['row name', 'code'],
+    'Clip Start': ['clip start', 'start'],
+    'Clip End': ['clip end', 'stop', 'end'],
+    'EQUIPO': ['equipo'],
+    'JUGADOR': ['jugador', 'player'],
+    'RESULTADO': ['resultado', 'result'],
+    'FORM': ['form', 'formacion']
+}
+
+SNIFF_SAMPLE_BYTES = 64 * 1024 # El delimitador se detecta sobre una muestra, no sobre todo el archivo
+CANDIDATE_DELIMITERS = ",;\t|"
+CSV_CACHE_MAX_ENTRIES = 32
+CLIP_ID = "clip_id"
+REQUIRED_COLUMNS = ['Row Name', 'Clip Start', 'Clip End']
+
+
+class MissingColumnsError(ValueError):
+    """El CSV no tiene alguna de las columnas obligatorias (ni sus alias)."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        super().__init__(f"Faltan columnas obligatorias: {', '.join(columns)}")
+
+
+def uses_csv_urls(df: pd.DataFrame) -> bool:
+    """True si los video_id salen de la columna URL del CSV y no del video por defecto."""
+    return "URL" in df.columns and df["URL"].notna().any()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def sniff_delimiter(data: bytes) -> str:
+    """Detecta el delimitador en las primeras líneas completas del archivo."""
+    sample = data[:SNIFF_SAMPLE_BYTES]
+    if len(data) > SNIFF_SAMPLE_BYTES and b"\n" in sample:
+        sample = sample[:sample.rfind(b"\n")]
+    try:
+        return csv.Sniffer().sniff(_decode(sample), delimiters=CANDIDATE_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def parse_csv(data: bytes) -> pd.DataFrame:
+    """Parsea el CSV con el motor C de pandas usando el delimitador detectado en la muestra."""
+    sep = sniff_delimiter(data)
+    try:
+        return pd.read_csv(io.BytesIO(data), sep=sep, engine="c", encoding="utf-8-sig", low_memory=False)
+    except UnicodeDecodeError:
+        return pd.read_csv(io.BytesIO(data), sep=sep, engine="c", encoding="latin-1", low_memory=False)
+
+
+def normalize_clips(df: pd.DataFrame, default_video_id: Optional[str] = None) -> pd.DataFrame:
+    """
+    Lleva un CSV de clips al formato estándar: nombres de columna, tiempos numéricos,
+    duración y video_id (de la columna URL o, si no hay, del video por defecto), con
+    dtypes compactos (ver frame_memory.compact_dtypes).
+    """
+    # --- Lógica de mapeo de columnas flexible y insensible a mayúsculas ---
+    df = df.rename(columns={col: col.strip() for col in df.columns})
+    lower_case_map = {col.lower(): col for col in df.columns}
+    rename_final = {}
+    for standard_name, possible_names in COLUMN_MAPPING.items():
+        for name in possible_names:
+            if name in lower_case_map:
+                rename_final[lower_case_map[name]] = standard_name
+                break
+    df = df.rename(columns=rename_final)
+    missing_required = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_required:
+        raise MissingColumnsError(missing_required)
+
+    # --- Procesamiento de datos ---
+    if 'EQUIPO' not in df.columns:
+        df['EQUIPO'] = 'N/A'
+    df['EQUIPO'] = df['EQUIPO'].fillna('N/A')
+
+    df["Clip Start"] = pd.to_numeric(df["Clip Start"], errors='coerce')
+    df["Clip End"] = pd.to_numeric(df["Clip End"], errors='coerce')
+    df = df.dropna(subset=["Clip Start", "Clip End"])
+    df["duracion"] = (df["Clip End"] - df["Clip Start"]).round(0)
+
+    if uses_csv_urls(df):
+        df["video_id"] = extraer_video_ids(df["URL"])
+    elif default_video_id is not None:
+        df["video_id"] = default_video_id
+    return compact_dtypes(df)
+
+
+def assign_clip_ids(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Numera los clips (0..n-1) en un índice `clip_id`: identifica cada fila aunque dos clips
+    compartan evento, equipo y segundo de inicio, y `df.loc[ids]` lo resuelve por hash.
+    """
+    df = df.reset_index(drop=True)
+    df.index.name = CLIP_ID
+    return df
+
+
+@st.cache_data(show_spinner=False, max_entries=CSV_CACHE_MAX_ENTRIES)
+def _load_clips(file_hash: str, default_video_id: Optional[str], _data: bytes) -> pd.DataFrame:
+    # La clave de caché es el hash del contenido: `_data` no se vuelve a hashear en cada rerun.
+    return normalize_clips(parse_csv(_data), default_video_id)
+
+
+def load_clips_csv(data: bytes, default_video_id: Optional[str] = None, file_hash: Optional[str] = None):
+    """
+    Devuelve (hash, DataFrame normalizado) de un CSV de clips, memoizado por el hash del
+    contenido: el mismo archivo se parsea una sola vez por proceso.
+    """
+    file_hash = file_hash or content_hash(data)
+    return file_hash, _load_clips(file_hash, default_video_id, data)
+
+
+def uploaded_file_hash(uploaded_file) -> str:
+    """Hash del contenido de un archivo del uploader, calculado una sola vez por subida."""
+    hashes = st.session_state.setdefault("_uploaded_file_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes.clear()
+        hashes[uploaded_file.file_id] = content_hash(uploaded_file.getvalue())
+    return hashes[uploaded_file.file_id]
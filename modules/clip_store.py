@@ -0,0 +1,121 @@
+# clip_store.py
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Carpeta raíz de los datasets guardados (configurable por variable de entorno).
+CLIP_STORE_DIR = os.environ.get(
+    "CLIP_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "databasevideo_clip_store"),
+)
+STORE_EXTENSION = ".feather"
+METADATA_KEY = b"databasevideo" # Metadatos propios dentro del esquema Arrow del archivo
+
+
+def user_dir(email: str) -> str:
+    """Carpeta del usuario (hash del email: no quedan direcciones en las rutas del disco)."""
+    user_hash = hashlib.sha1(email.strip().lower().encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CLIP_STORE_DIR, user_hash)
+
+
+def _dataset_path(email: str, name: str) -> str:
+    # El slug hace legible el archivo; el hash del nombre evita que "a b" y "a_b" se pisen.
+    name = name.strip()
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("._") or "dataset"
+    name_hash = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    path = os.path.join(user_dir(email), f"{slug}-{name_hash}{STORE_EXTENSION}")
+
+    # Datasets guardados antes del hash: se siguen usando si el archivo es de este nombre
+    legacy_path = os.path.join(user_dir(email), slug + STORE_EXTENSION)
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        try:
+            if _read_metadata(legacy_path).get("name") == name:
+                return legacy_path
+        except (OSError, pa.ArrowInvalid, ValueError):
+            pass
+    return path
+
+
+def _read_metadata(path: str) -> dict:
+    # Solo se lee el esquema del archivo, no las columnas.
+    with pa.memory_map(path, "r") as source:
+        schema = pa.ipc.open_file(source).schema
+    return json.loads((schema.metadata or {}).get(METADATA_KEY, b"{}"))
+
+
+def save_dataset(email: str, name: str, df: pd.DataFrame, **extra) -> dict:
+    """
+    Guarda el DataFrame normalizado (con sus ediciones y dtypes compactos) como Feather sin
+    comprimir, que se vuelve a abrir sin reparsear ni descomprimir. Sobrescribe si el nombre ya existe.
+    """
+    path = _dataset_path(email, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    meta = {
+        "name": name.strip(),
+        "rows": len(df),
+        "saved_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        **extra,
+    }
+    table = pa.Table.from_pandas(df, preserve_index=True) # El índice identifica la selección de la tabla
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(meta).encode("utf-8")})
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    return meta
+
+
+def load_dataset(email: str, name: str) -> tuple:
+    """
+    Devuelve (DataFrame, metadatos) de un dataset guardado. `to_pandas` copia las columnas,
+    así que el archivo se cierra al terminar y después se puede sobrescribir o eliminar.
+    """
+    path = _dataset_path(email, name)
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        meta = json.loads((reader.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+        df = reader.read_all().to_pandas()
+    return df, meta
+
+
+def list_datasets(email: str) -> list:
+    """Metadatos de los datasets del usuario, del más reciente al más viejo."""
+    folder = user_dir(email)
+    if not os.path.isdir(folder):
+        return []
+    datasets = []
+    for filename in os.listdir(folder):
+        if not filename.endswith(STORE_EXTENSION):
+            continue
+        try:
+            meta = _read_metadata(os.path.join(folder, filename))
+        except (OSError, pa.ArrowInvalid, ValueError) as e:
+            print(f"Error leyendo el dataset guardado {filename}: {e}")
+            continue
+        meta.setdefault("name", filename[:-len(STORE_EXTENSION)])
+        datasets.append(meta)
+    return sorted(datasets, key=lambda meta: meta.get("saved_at", ""), reverse=True)
+
+
+def delete_dataset(email: str, name: str) -> bool:
+    try:
+        os.remove(_dataset_path(email, name))
+        return True
+    except OSError:
+        return False
+
+
+def default_dataset_name(filename: Optional[str]) -> str:
+    """Nombre sugerido para guardar: el del CSV sin extensión."""
+    if not filename:
+        return "dataset"
+    return os.path.splitext(os.path.basename(filename))[0]
@@ -0,0 +1,319 @@
+# clip_warehouse.py
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.clip_store import user_dir
+from modules.filter_engine import CATEGORICAL_MAX_VALUES, FilterEngine
+from modules.frame_memory import compact_dtypes, display_frame
+
+WAREHOUSE_FILENAME = "warehouse.sqlite3"
+INDEXED_COLUMNS = ["EQUIPO", "Row Name", "JUGADOR", "video_id"] # Equipo, evento, jugador y video
+MATCH_COLUMN = "Partido" # Columna con el nombre del partido en los resultados de las consultas
+ROW_ID = "clip_rowid" # Índice de los resultados: rowid de la fila en SQLite (para escribir ediciones)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    match_date TEXT,
+    csv_hash TEXT UNIQUE,
+    rows INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clips (
+    match_id INTEGER NOT NULL REFERENCES matches (match_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_clips_match ON clips (match_id);
+-- Estadísticas por partido y columna para armar los filtros sin recorrer los clips:
+-- valores distintos (JSON, solo si son pocos) y mínimo/máximo de las columnas numéricas.
+CREATE TABLE IF NOT EXISTS column_stats (
+    match_id INTEGER NOT NULL REFERENCES matches (match_id) ON DELETE CASCADE,
+    column_name TEXT NOT NULL,
+    distinct_values TEXT,
+    min_value REAL,
+    max_value REAL,
+    PRIMARY KEY (match_id, column_name)
+);
+"""
+
+
+def _quote(column: str) -> str:
+    return '"' + str(column).replace('"', '""') + '"'
+
+
+class ClipWarehouse:
+    """
+    Almacén de clips de varios partidos en un archivo SQLite local.
+
+    Cada CSV normalizado es un partido; sus filas van a la tabla `clips`, que suma columnas a
+    medida que llegan CSV con columnas nuevas. Hay índices sobre el partido, EQUIPO, Row Name,
+    JUGADOR y video_id, y los filtros dinámicos (listas = multiselect, tuplas = rango, igual
+    que en FilterEngine) se traducen a un WHERE, así solo las filas filtradas pasan a pandas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._profiles = {} # (partidos, columna) -> perfil; se vacía al cambiar los datos
+
+    # --- Esquema ---
+
+    def _table_columns(self) -> dict:
+        rows = self._conn.execute("PRAGMA table_info(clips)").fetchall()
+        return {row[1]: row[2] for row in rows if row[1] != "match_id"}
+
+    def columns(self) -> dict:
+        """Columnas de clips (sin match_id) -> tipo declarado en SQLite."""
+        with self._lock:
+            return self._table_columns()
+
+    @staticmethod
+    def _index_name(column: str) -> str:
+        return "idx_clips_" + "".join(c if c.isalnum() else "_" for c in column.lower())
+
+    def _ensure_columns(self, df: pd.DataFrame):
+        # Se llama con el lock tomado, dentro de la transacción de add_match
+        existing = self._table_columns()
+        for col in df.columns:
+            is_numeric = pd.api.types.is_numeric_dtype(df[col].dtype)
+            if col in existing:
+                if existing[col] == "REAL" and not is_numeric and df[col].notna().any():
+                    self._widen_to_text(col)
+                continue
+            sql_type = "REAL" if is_numeric else "TEXT"
+            self._conn.execute(f"ALTER TABLE clips ADD COLUMN {_quote(col)} {sql_type}")
+            if col in INDEXED_COLUMNS:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self._index_name(col)} ON clips ({_quote(col)}, match_id)")
+
+    def _widen_to_text(self, column: str):
+        """
+        Pasa a TEXT una columna REAL cuando un partido nuevo trae texto en ella: si no, las
+        consultas convertirían ese texto a NaN. Los números guardados pasan a texto ("12", "12.5").
+        """
+        # Se llama con el lock tomado, dentro de la transacción de add_match
+        quoted, tmp = _quote(column), _quote(f"{column}__text")
+        self._conn.execute(f"ALTER TABLE clips ADD COLUMN {tmp} TEXT")
+        self._conn.execute(
+            f"UPDATE clips SET {tmp} = CASE WHEN {quoted} = CAST({quoted} AS INTEGER) "
+            f"THEN CAST(CAST({quoted} AS INTEGER) AS TEXT) ELSE CAST({quoted} AS TEXT) END"
+        )
+        self._conn.execute(f"DROP INDEX IF EXISTS {self._index_name(column)}")
+        self._conn.execute(f"ALTER TABLE clips DROP COLUMN {quoted}")
+        self._conn.execute(f"ALTER TABLE clips RENAME COLUMN {tmp} TO {quoted}")
+        if column in INDEXED_COLUMNS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self._index_name(column)} ON clips ({quoted}, match_id)")
+        # Las estadísticas de los partidos anteriores se rehacen como columna de texto
+        match_ids = [row[0] for row in self._conn.execute(
+            "SELECT match_id FROM column_stats WHERE column_name = ?", (column,)
+        ).fetchall()]
+        for match_id in match_ids:
+            self._update_stats(match_id, [column])
+        print(f"Almacén de clips: la columna {column} pasó a texto porque un partido trae valores no numéricos.")
+
+    # --- Partidos ---
+
+    def add_match(self, df: pd.DataFrame, name: str, match_date=None, csv_hash=None) -> int:
+        """
+        Guarda un DataFrame de clips normalizado como partido. Si el mismo CSV (hash) ya estaba,
+        se reemplazan sus clips. Devuelve el match_id.
+        """
+        # Texto plano y tiempos redondeados: los rangos del slider coinciden con lo guardado
+        display = display_frame(df)
+        rows = display.astype(object).where(display.notna(), None)
+        columns = list(rows.columns)
+        created_at = datetime.datetime.now().isoformat(timespec="seconds")
+        match_date = match_date.isoformat() if hasattr(match_date, "isoformat") else match_date
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure_columns(display)
+                if csv_hash:
+                    self._conn.execute("DELETE FROM matches WHERE csv_hash = ?", (csv_hash,))
+                cursor = self._conn.execute(
+                    "INSERT INTO matches (name, match_date, csv_hash, rows, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (name, match_date, csv_hash, len(rows), created_at),
+                )
+                match_id = cursor.lastrowid
+                placeholders = ", ".join("?" * (len(columns) + 1))
+                self._conn.executemany(
+                    f"INSERT INTO clips (match_id, {', '.join(_quote(c) for c in columns)}) VALUES ({placeholders})",
+                    ((match_id, *values) for values in rows.itertuples(index=False, name=None)),
+                )
+                self._update_stats(match_id, columns)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._profiles.clear()
+        return match_id
+
+    def matches(self) -> pd.DataFrame:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT match_id, name, match_date, rows FROM matches ORDER BY match_date DESC, match_id DESC"
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["match_id", "name", "match_date", "rows"])
+
+    def delete_match(self, match_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM matches WHERE match_id = ?", (int(match_id),))
+            self._profiles.clear()
+
+    # --- Filtros ---
+
+    @staticmethod
+    def _where(match_ids, filters: dict, columns) -> tuple:
+        clauses = [f"c.match_id IN ({', '.join('?' * len(match_ids))})"]
+        params = [int(match_id) for match_id in match_ids]
+        for col, kind, value in FilterEngine.state_key(filters):
+            if col not in columns:
+                continue
+            if kind == "in":
+                values = [v.item() if isinstance(v, np.generic) else v for v in value]
+                clauses.append(f"c.{_quote(col)} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+            else:
+                clauses.append(f"c.{_quote(col)} BETWEEN ? AND ?")
+                params.extend([float(value[0]), float(value[1])])
+        return " AND ".join(clauses), params
+
+    def _update_stats(self, match_id: int, columns):
+        # Se llama con el lock tomado; cada consulta usa el índice por partido
+        sql_types = self._table_columns()
+        for col in columns:
+            quoted = _quote(col)
+            distinct, low, high = self._conn.execute(
+                f"SELECT COUNT(DISTINCT {quoted}), MIN({quoted}), MAX({quoted}) FROM clips WHERE match_id = ?",
+                (match_id,),
+            ).fetchone()
+            values = None
+            if sql_types.get(col) == "TEXT" and distinct < CATEGORICAL_MAX_VALUES:
+                values = json.dumps([row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT {quoted} FROM clips WHERE match_id = ? AND {quoted} IS NOT NULL", (match_id,)
+                )])
+            numeric = sql_types.get(col) == "REAL"
+            self._conn.execute(
+                "INSERT OR REPLACE INTO column_stats (match_id, column_name, distinct_values, min_value, max_value) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (match_id, col, values, low if numeric else None, high if numeric else None),
+            )
+
+    def profile(self, match_ids, column: str):
+        """
+        Cómo filtrar una columna en los partidos elegidos, como FilterEngine: ("categorical",
+        opciones), ("numeric", (mínimo, máximo)) o None si no tiene sentido filtrarla. Se arma
+        con las estadísticas por partido, sin leer los clips.
+        """
+        key = (tuple(sorted(match_ids)), column)
+        placeholders = ", ".join("?" * len(match_ids))
+        # Todo bajo el lock: add_match, delete_match y update_cells vacían la caché con el lock tomado
+        with self._lock:
+            if key in self._profiles:
+                return self._profiles[key]
+            sql_type = self._table_columns().get(column)
+            rows = self._conn.execute(
+                f"SELECT distinct_values, min_value, max_value FROM column_stats "
+                f"WHERE column_name = ? AND match_id IN ({placeholders})",
+                [column, *(int(match_id) for match_id in match_ids)],
+            ).fetchall()
+
+            profile = None
+            if rows and sql_type == "TEXT" and all(values is not None for values, _, _ in rows):
+                options = sorted({value for values, _, _ in rows for value in json.loads(values)})
+                if 1 < len(options) < CATEGORICAL_MAX_VALUES:
+                    profile = ("categorical", options)
+            elif rows and sql_type == "REAL":
+                lows = [low for _, low, _ in rows if low is not None]
+                highs = [high for _, _, high in rows if high is not None]
+                if lows and min(lows) < max(highs):
+                    profile = ("numeric", (float(min(lows)), float(max(highs))))
+            self._profiles[key] = profile
+            return profile
+
+    def count(self, match_ids, filters: dict) -> int:
+        where, params = self._where(match_ids, filters, self.columns())
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM clips c WHERE {where}", params).fetchone()[0]
+
+    def query(self, match_ids, filters: dict) -> pd.DataFrame:
+        """
+        Clips de los partidos elegidos que cumplen los filtros, con la columna Partido y el rowid
+        como índice, en dtypes compactos (ver frame_memory.compact_dtypes).
+        """
+        columns = self.columns()
+        if not match_ids:
+            return pd.DataFrame(columns=[MATCH_COLUMN, *columns])
+        where, params = self._where(match_ids, filters, columns)
+        placeholders = ", ".join("?" * len(match_ids))
+        with self._lock:
+            # Solo las columnas que traen los CSV de estos partidos (las demás estarían vacías)
+            present = {row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT column_name FROM column_stats WHERE match_id IN ({placeholders})",
+                [int(match_id) for match_id in match_ids],
+            )}
+            selected = [col for col in columns if col in present]
+            select = "".join(f", c.{_quote(col)}" for col in selected)
+            rows = self._conn.execute(f"SELECT c.rowid, c.match_id{select} FROM clips c WHERE {where}", params).fetchall()
+        df = pd.DataFrame.from_records(rows, columns=[ROW_ID, MATCH_COLUMN, *selected]).set_index(ROW_ID)
+        names = self.matches().set_index("match_id")["name"]
+        df[MATCH_COLUMN] = df[MATCH_COLUMN].map(names).astype("category")
+        for col in selected:
+            if columns[col] == "REAL":
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        return compact_dtypes(df)
+
+    def update_cells(self, edits):
+        """Escribe en SQLite las ediciones de la tabla (CellEdit con el rowid como fila)."""
+        columns = self.columns()
+        updates = [edit for edit in edits if edit.column in columns]
+        if not updates:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                touched = {}
+                for edit in updates:
+                    value = edit.value.item() if isinstance(edit.value, np.generic) else edit.value
+                    value = None if pd.isna(value) else value
+                    cursor = self._conn.execute(
+                        f"UPDATE clips SET {_quote(edit.column)} = ? WHERE rowid = ? RETURNING match_id",
+                        (value, int(edit.row)),
+                    )
+                    for (match_id,) in cursor.fetchall():
+                        touched.setdefault(match_id, set()).add(edit.column)
+                for match_id, edited_columns in touched.items():
+                    self._update_stats(match_id, edited_columns)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._profiles.clear()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@st.cache_resource(show_spinner=False)
+def _open_warehouse(path: str) -> ClipWarehouse:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return ClipWarehouse(path)
+
+
+def get_clip_warehouse(email: str) -> ClipWarehouse:
+    """Almacén del usuario; una conexión por archivo y por proceso."""
+    return _open_warehouse(os.path.join(user_dir(email), WAREHOUSE_FILENAME))
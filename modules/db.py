@@ -0,0 +1,66 @@
+# db.py
+
+import streamlit as st
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+DB_NAME = "login_logs"
+
+# Valores por defecto del pool. Se pueden sobrescribir desde st.secrets con las claves de abajo.
+DEFAULT_MONGO_OPTIONS = {
+    "maxPoolSize": 20,
+    "minPoolSize": 0,
+    "maxIdleTimeMS": 60000,
+    "serverSelectionTimeoutMS": 5000,
+    "connectTimeoutMS": 5000,
+    "socketTimeoutMS": 10000,
+}
+SECRET_KEYS = {
+    "maxPoolSize": "MONGO_MAX_POOL_SIZE",
+    "minPoolSize": "MONGO_MIN_POOL_SIZE",
+    "maxIdleTimeMS": "MONGO_MAX_IDLE_TIME_MS",
+    "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+    "connectTimeoutMS": "MONGO_CONNECT_TIMEOUT_MS",
+    "socketTimeoutMS": "MONGO_SOCKET_TIMEOUT_MS",
+}
+
+
+def mongo_options() -> dict:
+    """Opciones del MongoClient: valores por defecto + los definidos en st.secrets."""
+    options = dict(DEFAULT_MONGO_OPTIONS)
+    for option, secret_key in SECRET_KEYS.items():
+        value = st.secrets.get(secret_key)
+        if value is not None:
+            options[option] = int(value)
+    return options
+
+
+def ensure_indexes(db):
+    """Crea (si no existen) los índices que usan las consultas de la app y del webhook."""
+    index_specs = [
+        (db.suscripciones, [("user_email", ASCENDING)], {"name": "user_email_unique", "unique": True}),
+        (db.suscripciones, [("updated_at", ASCENDING)], {"name": "updated_at"}),
+        (db.saas_dbvideo, [("timestamp", DESCENDING)], {"name": "timestamp"}),
+    ]
+    for collection, keys, options in index_specs:
+        try:
+            collection.create_index(keys, **options)
+        except ConnectionFailure as e:
+            # Sin servidor no tiene sentido esperar el timeout de cada índice; se reintenta al reiniciar.
+            print(f"No se pudieron crear los índices de MongoDB: {e}")
+            return
+        except PyMongoError as e:
+            # Por ejemplo, emails duplicados que impiden el índice único: la app sigue funcionando.
+            print(f"No se pudo crear el índice {options['name']} en {collection.name}: {e}")
+
+
+@st.cache_resource(show_spinner=False)
+def get_mongo_client() -> MongoClient:
+    """Un único MongoClient (con su pool) por proceso, compartido por todas las sesiones."""
+    client = MongoClient(st.secrets["MONGO_URI"], **mongo_options())
+    ensure_indexes(client[DB_NAME])
+    return client
+
+
+def get_database():
+    return get_mongo_client()[DB_NAME]
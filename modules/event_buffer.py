@@ -0,0 +1,146 @@
+# event_buffer.py
+
+import atexit
+import queue
+import threading
+import time
+
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+class EventBuffer:
+    """
+    Buffer en memoria para eventos de uso (logins, etc.) que se escriben en MongoDB con
+    insert_many desde un hilo en segundo plano, por tamaño de lote o por tiempo.
+
+    La cola es acotada: si se llena, el evento nuevo se descarta ("drop_newest") o se
+    descarta el más viejo ("drop_oldest"). Nunca bloquea al hilo del script de Streamlit.
+    """
+
+    def __init__(self, collection, max_queue=10000, batch_size=200, flush_interval=2.0,
+                 overflow="drop_newest", max_retries=3):
+        if overflow not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"Política de desborde desconocida: {overflow}")
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._drain_deadline = None # Límite (monotonic) del vaciado final; lo fija close()
+        self._counters_lock = threading.Lock()
+        self._counters = {"queued": 0, "flushed": 0, "dropped": 0, "failed_batches": 0}
+        self._worker = threading.Thread(target=self._run, name="event-buffer", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def enqueue(self, event: dict) -> bool:
+        """Encola un evento. Devuelve False si se descartó por cola llena o buffer cerrado."""
+        if self._stop.is_set():
+            self._count("dropped")
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            if self.overflow == "drop_newest":
+                self._count("dropped")
+                return False
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("queued")
+        return True
+
+    def _drain(self, batch, limit):
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _drain_time_left(self) -> float:
+        if not self._stop.is_set():
+            return float("inf")
+        return self._drain_deadline - time.monotonic()
+
+    def _backoff(self) -> bool:
+        """Espera antes de reintentar. Devuelve False si se terminó el tiempo del vaciado final."""
+        if not self._stop.is_set() and not self._stop.wait(RETRY_BACKOFF_SECONDS):
+            return True
+        # Cerrando: _stop.wait ya no espera, así que se duerme dentro del tiempo que queda
+        remaining = self._drain_time_left()
+        if remaining <= 0:
+            return False
+        time.sleep(min(RETRY_BACKOFF_SECONDS, remaining))
+        return True
+
+    def _write(self, batch) -> bool:
+        for attempt in range(self.max_retries):
+            if self._drain_time_left() <= 0:
+                break
+            try:
+                # insert_many agrega _id a cada documento; se copian para poder reintentar.
+                self.collection.insert_many([dict(event) for event in batch], ordered=False)
+                self._count("flushed", len(batch))
+                return True
+            except Exception as e:
+                self._count("failed_batches")
+                print(f"Error al escribir {len(batch)} eventos en MongoDB: {e}")
+                if attempt == self.max_retries - 1 or not self._backoff():
+                    break
+        self._count("dropped", len(batch))
+        return False
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                self._drain(batch, self.batch_size)
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+        # Vaciado final al cerrar el proceso, con reintentos hasta el límite que fijó close()
+        self._drain(batch, float("inf"))
+        dropped = 0
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            if not self._write(chunk):
+                dropped += len(chunk)
+        if dropped:
+            print(f"Vaciado final del buffer: se descartaron {dropped} de {len(batch)} eventos.")
+
+    def close(self, timeout=5.0):
+        """
+        Detiene el hilo escribiendo lo pendiente, con reintentos durante como mucho `timeout`
+        segundos; lo que no se pudo escribir se cuenta como descartado. Se llama sola al salir (atexit).
+        """
+        if self._stop.is_set():
+            return
+        self._drain_deadline = time.monotonic() + timeout
+        self._stop.set()
+        self._worker.join(timeout + RETRY_BACKOFF_SECONDS)
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self._counters)
+        counters["pending"] = self._queue.qsize()
+        return counters
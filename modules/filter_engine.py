@@ -0,0 +1,182 @@
+# filter_engine.py
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+CATEGORICAL_MAX_VALUES = 50 # Columnas de texto con menos valores distintos se filtran con multiselect
+RESULT_CACHE_MAX_ENTRIES = 64
+
+
+def is_text_dtype(dtype) -> bool:
+    return (
+        pd.api.types.is_object_dtype(dtype)
+        or pd.api.types.is_string_dtype(dtype)
+        or isinstance(dtype, pd.CategoricalDtype)
+    )
+
+
+class FilterEngine:
+    """
+    Índices de filtrado construidos una vez por DataFrame cargado.
+
+    - Texto: códigos de `pd.factorize` y una tabla de búsqueda por estado del multiselect,
+      así un filtro es un solo acceso indexado sobre los códigos (sin comparar strings).
+    - Números: posiciones ordenadas por valor; un rango se resuelve con `searchsorted`.
+
+    El resultado (posiciones de fila, ordenadas) se memoiza por el estado completo de los
+    filtros. Tras editar celdas hay que llamar a `invalidate` con las columnas afectadas.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._codes = {} # col -> (codes, uniques)
+        self._sorted = {} # col -> (orden, valores ordenados)
+        self._nunique = {}
+        self._results = OrderedDict()
+
+    # --- Índices por columna (perezosos) ---
+
+    def _factorized(self, col):
+        if col not in self._codes:
+            self._codes[col] = pd.factorize(self.df[col], use_na_sentinel=True)
+        return self._codes[col]
+
+    def _sorted_values(self, col):
+        if col not in self._sorted:
+            series = self.df[col]
+            # Se conserva float32 (tiempos compactados) para comparar en la misma precisión
+            dtype = series.dtype if series.dtype.kind == "f" else np.dtype("float64")
+            values = series.to_numpy(dtype=dtype, na_value=np.nan)
+            order = np.argsort(values, kind="stable") # Los NaN quedan al final
+            self._sorted[col] = (order, values[order])
+        return self._sorted[col]
+
+    def nunique(self, col) -> int:
+        if col not in self._nunique:
+            self._nunique[col] = self.df[col].nunique()
+        return self._nunique[col]
+
+    def is_categorical(self, col) -> bool:
+        return is_text_dtype(self.df[col].dtype) and 1 < self.nunique(col) < CATEGORICAL_MAX_VALUES
+
+    def is_numeric(self, col) -> bool:
+        return pd.api.types.is_numeric_dtype(self.df[col].dtype) and self.nunique(col) > 1
+
+    def options(self, col) -> list:
+        """Valores distintos (sin NaN) para el multiselect, ordenados cuando se puede."""
+        options = [value for value in self._factorized(col)[1].tolist() if not pd.isna(value)]
+        try:
+            options.sort()
+        except TypeError:
+            pass
+        return options
+
+    def value_range(self, col):
+        _, values = self._sorted_values(col)
+        values = values[~np.isnan(values)]
+        # str() da la representación más corta del dtype: 411.37 y no 411.3699951171875
+        return float(str(values[0])), float(str(values[-1]))
+
+    # --- Máscaras ---
+
+    def _isin_mask(self, col, selected):
+        codes, uniques = self._factorized(col)
+        allowed = np.zeros(len(uniques) + 1, dtype=bool) # La última posición es el NaN (código -1)
+        allowed[:-1] = pd.Index(uniques).isin(list(selected))
+        return allowed[codes]
+
+    def _range_mask(self, col, low, high):
+        order, values = self._sorted_values(col)
+        low, high = values.dtype.type(low), values.dtype.type(high)
+        start = np.searchsorted(values, low, side="left")
+        stop = np.searchsorted(values, high, side="right")
+        mask = np.zeros(len(order), dtype=bool)
+        mask[order[start:stop]] = True
+        return mask
+
+    @staticmethod
+    def state_key(filters: dict):
+        """Clave hashable de un estado de filtros (listas = multiselect, tuplas = rango)."""
+        key = []
+        for col, value in sorted(filters.items(), key=lambda item: str(item[0])):
+            if isinstance(value, list):
+                key.append((col, "in", frozenset(value)))
+            elif isinstance(value, tuple):
+                key.append((col, "range", tuple(value)))
+        return tuple(key)
+
+    def positions(self, filters: dict) -> np.ndarray:
+        """Posiciones (iloc) de las filas que cumplen todos los filtros."""
+        key = self.state_key(filters)
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            return cached
+
+        mask = np.ones(len(self.df), dtype=bool)
+        for col, kind, value in key:
+            if col not in self.df.columns:
+                continue
+            if kind == "in":
+                mask &= self._isin_mask(col, value)
+            else:
+                mask &= self._range_mask(col, value[0], value[1])
+        result = np.flatnonzero(mask)
+        result.setflags(write=False)
+
+        self._results[key] = result
+        while len(self._results) > RESULT_CACHE_MAX_ENTRIES:
+            self._results.popitem(last=False)
+        return result
+
+    def sorted_positions(self, filters: dict, column=None, ascending=True) -> np.ndarray:
+        """Posiciones filtradas ordenadas por `column` (orden estable, NaN al final), memoizadas."""
+        positions = self.positions(filters)
+        if column is None or column not in self.df.columns:
+            return positions
+        key = (self.state_key(filters), "sort", column, ascending)
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            return cached
+
+        values = self.df[column].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        result = positions[order]
+        result.setflags(write=False)
+
+        self._results[key] = result
+        while len(self._results) > RESULT_CACHE_MAX_ENTRIES:
+            self._results.popitem(last=False)
+        return result
+
+    def filter(self, filters: dict) -> pd.DataFrame:
+        return self.df.iloc[self.positions(filters)]
+
+    def nbytes(self) -> int:
+        """Memoria de los índices y resultados memoizados (para el reporte de memoria)."""
+        total = sum(codes.nbytes for codes, _ in self._codes.values())
+        total += sum(order.nbytes + values.nbytes for order, values in self._sorted.values())
+        total += sum(result.nbytes for result in self._results.values())
+        return total
+
+    def invalidate(self, columns=None):
+        """Descarta los índices de las columnas editadas (o todos) y los resultados memoizados."""
+        columns = list(self.df.columns) if columns is None else columns
+        for col in columns:
+            self._codes.pop(col, None)
+            self._sorted.pop(col, None)
+            self._nunique.pop(col, None)
+        self._results.clear()
+
+
+def get_filter_engine(df: pd.DataFrame) -> FilterEngine:
+    """Motor de filtros de la sesión; se reconstruye solo cuando cambia el DataFrame cargado."""
+    engine = st.session_state.get("filter_engine")
+    if engine is None or engine.df is not df:
+        engine = FilterEngine(df)
+        st.session_state.filter_engine = engine
+    return engine
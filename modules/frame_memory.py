@@ -0,0 +1,92 @@
+# frame_memory.py
+
+import numpy as np
+import pandas as pd
+
+from modules.filter_engine import is_text_dtype
+
+TIMING_COLUMNS = ["Clip Start", "Clip End", "duracion"]
+INTERNED_COLUMNS = ["video_id"] # Siempre categóricas: pocos valores repetidos en todas las filas
+CATEGORY_MAX_RATIO = 0.5 # Texto con menos de esta fracción de valores distintos pasa a category
+DISPLAY_DECIMALS = 3 # Los tiempos vienen con milisegundos
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce la memoria de un DataFrame de clips: tiempos en float32 y columnas de texto con
+    pocos valores distintos (EQUIPO, RESULTADO, Row Name, video_id...) como category.
+    """
+    compacted = {}
+    for col in df.columns:
+        series = df[col]
+        if col in TIMING_COLUMNS and pd.api.types.is_float_dtype(series.dtype):
+            compacted[col] = series.astype("float32")
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        elif col in INTERNED_COLUMNS or (
+            is_text_dtype(series.dtype) and series.nunique() <= len(series) * CATEGORY_MAX_RATIO
+        ):
+            compacted[col] = series.astype("category")
+    return df.assign(**compacted) if compacted else df
+
+
+def display_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copia para mostrar en AgGrid: category vuelve a texto y float32 a float64 redondeado,
+    así la tabla muestra 411.37 y no 411.3699951171875.
+    """
+    converted = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            converted[col] = df[col].astype(object)
+        elif dtype == np.float32:
+            converted[col] = df[col].astype("float64").round(DISPLAY_DECIMALS)
+    return df.assign(**converted) if converted else df
+
+
+def coerce_cell_value(series: pd.Series, value):
+    """Adapta un valor editado al dtype compacto de la columna antes de escribirlo con .at."""
+    dtype = series.dtype
+    if pd.isna(value):
+        return np.nan if dtype.kind == "f" else value
+    if isinstance(dtype, pd.CategoricalDtype):
+        return value
+    if dtype.kind == "f":
+        return dtype.type(value)
+    return value
+
+
+def ensure_category(df: pd.DataFrame, column, value):
+    """Agrega `value` a las categorías de la columna si hace falta (in place)."""
+    dtype = df[column].dtype
+    if isinstance(dtype, pd.CategoricalDtype) and not pd.isna(value) and value not in dtype.categories:
+        df[column] = df[column].cat.add_categories([value])
+
+
+def object_nbytes(value) -> int:
+    """Bytes aproximados de un objeto guardado en session_state."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    nbytes = getattr(value, "nbytes", None)
+    if callable(nbytes):
+        return int(nbytes())
+    return 0
+
+
+def session_memory_report(state) -> pd.DataFrame:
+    """Bytes por objeto de datos de la sesión (DataFrames, índices, motores), de mayor a menor."""
+    rows = []
+    for key in list(state.keys()):
+        try:
+            nbytes = object_nbytes(state[key])
+        except Exception:
+            continue
+        if nbytes:
+            rows.append({"objeto": str(key), "MB": round(nbytes / 1024 ** 2, 3), "bytes": nbytes})
+    report = pd.DataFrame(rows, columns=["objeto", "MB", "bytes"])
+    return report.sort_values("bytes", ascending=False, ignore_index=True)
@@ -0,0 +1,76 @@
+# grid_edits.py
+
+from typing import NamedTuple
+
+import pandas as pd
+import streamlit as st
+
+from modules.frame_memory import coerce_cell_value, ensure_category
+
+EDIT_EVENTS = {"cellValueChanged"}
+ROW_ID_FIELD = "::auto_unique_id::" # Posición de la fila en el DataFrame que se pasó a AgGrid
+
+
+class CellEdit(NamedTuple):
+    row: object # Etiqueta del índice en el DataFrame original
+    column: str
+    value: object
+
+
+def _is_new_edit_event(grid_response, grid_key) -> bool:
+    """
+    True solo en el rerun que disparó una edición. AgGrid devuelve el último evento también
+    en reruns ajenos a la tabla (sidebar, botones), así que se recuerda el último procesado.
+    """
+    event = grid_response.event_data or {}
+    if event.get("type") not in EDIT_EVENTS:
+        return False
+    signature = repr(event)
+    state_key = f"_last_grid_edit_{grid_key}"
+    if st.session_state.get(state_key) == signature:
+        return False
+    st.session_state[state_key] = signature
+    return True
+
+
+def _coerce_like(values: pd.Series, reference: pd.Series) -> pd.Series:
+    # El editor de texto de AgGrid devuelve strings también en columnas numéricas.
+    if pd.api.types.is_numeric_dtype(reference.dtype):
+        return pd.to_numeric(values, errors="coerce")
+    return values
+
+
+def extract_cell_edits(grid_response, df_view: pd.DataFrame, columns, grid_key) -> list:
+    """
+    Celdas editadas en la tabla como deltas (fila, columna, valor nuevo). Solo mira las
+    columnas editables y solo cuando el rerun lo disparó una edición; si no, devuelve [].
+    """
+    if not _is_new_edit_event(grid_response, grid_key):
+        return []
+    nodes = [n for n in grid_response.grid_response.get("nodes", []) if not n.get("group") and n.get("data")]
+    if len(nodes) != len(df_view) or any(ROW_ID_FIELD not in n["data"] for n in nodes):
+        return [] # La tabla ya no corresponde a la vista actual (cambió entre render y evento)
+
+    positions = [int(n["data"][ROW_ID_FIELD]) for n in nodes]
+    edits = []
+    for col in columns:
+        if col not in df_view.columns:
+            continue
+        previo = df_view[col].iloc[positions].reset_index(drop=True)
+        nuevo = _coerce_like(pd.Series([n["data"].get(col) for n in nodes], dtype=object), previo)
+        distintos = (nuevo != previo) & ~(nuevo.isna() & previo.isna())
+        for i in distintos.to_numpy().nonzero()[0]:
+            edits.append(CellEdit(df_view.index[positions[i]], col, nuevo.iat[i]))
+    return edits
+
+
+def apply_cell_edits(edits, *frames):
+    """Escribe los deltas celda por celda en cada DataFrame que contenga la fila."""
+    for df in frames:
+        if df is None:
+            continue
+        for edit in edits:
+            if edit.row in df.index and edit.column in df.columns:
+                value = coerce_cell_value(df[edit.column], edit.value)
+                ensure_category(df, edit.column, value)
+                df.at[edit.row, edit.column] = value
@@ -0,0 +1,105 @@
+# page_registry.py
+
+import importlib
+import re
+import subprocess
+import sys
+from typing import Callable, NamedTuple, Optional
+
+
+class PageSpec(NamedTuple):
+    module: str
+    function: str
+    needs_user_name: bool = False
+
+
+# Mapa current_page -> página. Los módulos se importan recién cuando se abre la página,
+# así la pantalla de login y el inicio no pagan yt_dlp, reportlab, PIL, etc.
+PAGES = {
+    "youtube_database": PageSpec("page.YouTube.Data_Base", "run_data_base_page"),
+    "youtube_database_demo": PageSpec("page.DEMO.Data_Base_Demo", "run_data_base_demo_page"),
+    "youtube_links": PageSpec("page.YouTube.Links_YouTube", "run_links_youtube_page"),
+    "youtube_channel": PageSpec("page.YouTube.Channel_YouTube", "run_channel_youtube_page"),
+    "longo_match": PageSpec("page.Longo_Match.xmltocsvjson", "run_xml_to_csv_json_page"),
+    "fulcrum_angles": PageSpec("page.Fulcrum.Angles.composerToTimelineJson", "run_composer_to_timeline_page", needs_user_name=True),
+    "fulcrum_angles_tabla_filter": PageSpec("page.Fulcrum.Angles.Angle_Tabla_filter", "run_angle_tabla_filter_page"),
+    "piston_hls": PageSpec("page.Fulcrum.Piston.piston", "run_piston_page"),
+    "playlist_youtube": PageSpec("page.YouTube.Playlist_YouTube", "run_playlist_youtube_page"),
+    "download_playlist": PageSpec("page.YouTube.Download_Playlist", "run_download_playlist_page"),
+    "sportcode_to_json": PageSpec("page.SPORTCODE.sportcode_to_json", "run_sportcode_to_json_page"),
+}
+
+# Módulos que se cargan en cada rerun (login + inicio). Tienen que entrar en el presupuesto.
+SHELL_MODULES = ["modules.auth_google", "modules.page_registry", "modules.yt_dlp_updater"]
+
+# Presupuestos de importación en milisegundos, medidos sobre streamlit/pandas ya importados.
+SHELL_IMPORT_BUDGET_MS = 400
+PAGE_IMPORT_BUDGET_MS = 1500
+
+
+def get_page_runner(page_key: str) -> Optional[Callable]:
+    """Devuelve la función run_*_page de la página, importando su módulo solo la primera vez."""
+    spec = PAGES.get(page_key)
+    if spec is None:
+        return None
+    module = importlib.import_module(spec.module)  # sys.modules la cachea entre reruns
+    return getattr(module, spec.function)
+
+
+def run_page(page_key: str, user_name: Optional[str] = None) -> bool:
+    """Ejecuta la página registrada. Devuelve False si la clave no existe."""
+    runner = get_page_runner(page_key)
+    if runner is None:
+        return False
+    if PAGES[page_key].needs_user_name:
+        runner(user_name)
+    else:
+        runner()
+    return True
+
+
+# --- MEDICIÓN DE TIEMPOS DE IMPORTACIÓN ---
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def measure_import_time(module_name: str, baseline: str = "streamlit, pandas") -> float:
+    """
+    Mide en un proceso limpio (python -X importtime) el costo acumulado en ms de importar
+    `module_name`, una vez que ya están importados los módulos de `baseline`.
+    """
+    code = f"import {baseline}; import {module_name}" if baseline else f"import {module_name}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match and match.group(4) == module_name:
+            cumulative_us = int(match.group(2))
+    return cumulative_us / 1000
+
+
+def check_import_budgets() -> list:
+    """Mide módulos base y páginas. Devuelve la lista de (módulo, ms, presupuesto) excedidos."""
+    over_budget = []
+    targets = [(name, SHELL_IMPORT_BUDGET_MS) for name in SHELL_MODULES]
+    targets += [(spec.module, PAGE_IMPORT_BUDGET_MS) for spec in PAGES.values()]
+    for module_name, budget in targets:
+        try:
+            elapsed = measure_import_time(module_name)
+        except subprocess.CalledProcessError as e:
+            print(f"{module_name:<50} ERROR al importar: {e.stderr.strip().splitlines()[-1]}")
+            over_budget.append((module_name, None, budget))
+            continue
+        status = "OK" if elapsed <= budget else "EXCEDIDO"
+        print(f"{module_name:<50} {elapsed:>9.1f} ms  (presupuesto {budget} ms)  {status}")
+        if elapsed > budget:
+            over_budget.append((module_name, elapsed, budget))
+    return over_budget
+
+
+if __name__ == "__main__":
+    # Uso: python -m modules.page_registry  (desde la raíz del repo)
+    sys.exit(1 if check_import_budgets() else 0)
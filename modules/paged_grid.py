@@ -0,0 +1,84 @@
+# paged_grid.py
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
+
+from modules.frame_memory import display_frame
+
+PAGE_SIZES = [50, 100, 250, 500]
+NO_SORT = "(orden original)"
+
+
+def render_page_controls(columns, total_rows, key, view_key):
+    """
+    Controles de orden y paginación. Devuelve (columna, ascendente, inicio, fin, clave) de la
+    página actual; la página vuelve a 1 cuando cambian los filtros, el orden o el tamaño de
+    página. La clave identifica la vista y la página, para montar un AgGrid por página.
+    """
+    col_sort, col_dir, col_size, col_page = st.columns([2, 1, 1, 1])
+    sort_column = col_sort.selectbox("Ordenar por", [NO_SORT] + list(columns), key=f"{key}_sort")
+    ascending = col_dir.selectbox("Sentido", ["Ascendente", "Descendente"], key=f"{key}_dir") == "Ascendente"
+    page_size = col_size.selectbox("Filas por página", PAGE_SIZES, key=f"{key}_page_size")
+    sort_column = None if sort_column == NO_SORT else sort_column
+
+    page_count = max(1, math.ceil(total_rows / page_size))
+    signature = (view_key, sort_column, ascending, page_size)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_page"] = 1
+    else:
+        st.session_state[f"{key}_page"] = min(st.session_state.get(f"{key}_page", 1), page_count)
+    page = col_page.number_input("Página", min_value=1, max_value=page_count, step=1, key=f"{key}_page")
+
+    start = (int(page) - 1) * page_size
+    stop = min(start + page_size, total_rows)
+    st.caption(f"Filas {start + 1 if total_rows else 0}–{stop} de {total_rows} · página {int(page)} de {page_count}")
+    page_key = f"{abs(hash(signature)):x}_{int(page)}"
+    return sort_column, ascending, start, stop, page_key
+
+
+def render_paged_grid(df, page_positions, columns, key, selection_key, editable_columns=(), height=400):
+    """
+    AgGrid con solo las filas de la página (posiciones de `df`) y las columnas pedidas. El orden
+    y los filtros ya vienen resueltos del lado del servidor, así que en la tabla se desactivan.
+
+    La selección se guarda en `st.session_state[selection_key]` como etiquetas del índice de
+    `df`, estables entre páginas. Devuelve (grid_response, DataFrame de la página mostrada).
+    """
+    page_df = display_frame(df.iloc[page_positions, df.columns.get_indexer(columns)])
+    selected = pd.Index(st.session_state.get(selection_key, []))
+
+    gb = GridOptionsBuilder.from_dataframe(page_df)
+    gb.configure_default_column(sortable=False, filter=False)
+    pre_selected = [str(i) for i in np.flatnonzero(page_df.index.isin(selected))]
+    gb.configure_selection("multiple", use_checkbox=True, header_checkbox=True, pre_selected_rows=pre_selected)
+    for col in editable_columns:
+        if col in page_df.columns:
+            gb.configure_column(col, editable=True)
+
+    grid_response = AgGrid(
+        page_df,
+        gridOptions=gb.build(),
+        update_mode=GridUpdateMode.MODEL_CHANGED,
+        theme="streamlit",
+        height=height,
+        key=key, # Incluye la página (ver render_page_controls): AgGrid no recarga un componente montado
+        reload_data=False,
+    )
+
+    nodes = grid_response.grid_response.get("nodes") if isinstance(grid_response.grid_response, dict) else None
+    if nodes is not None and len(nodes) == len(page_df):
+        # Solo cambia la selección de las filas de esta página; las de otras páginas se conservan
+        page_selected = grid_response.selected_rows
+        page_labels = page_df.index
+        if page_selected is not None:
+            page_labels_selected = page_labels[page_selected.index.astype(int)]
+        else:
+            page_labels_selected = page_labels[:0]
+        kept = selected[~selected.isin(page_labels)]
+        st.session_state[selection_key] = kept.append(page_labels_selected).to_numpy()
+    return grid_response, page_df
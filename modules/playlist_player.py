@@ -0,0 +1,65 @@
+# playlist_player.py
+
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "playlist_player")
+TITLE_COLUMNS = ["Row Name", "EQUIPO", "JUGADOR", "RESULTADO"]
+PLAYER_HEIGHT = 650
+
+_playlist_component = components.declare_component("playlist_player", path=FRONTEND_DIR)
+
+
+def _optional_float(value) -> Optional[float]:
+    return None if pd.isna(value) else float(value)
+
+
+def playlist_clips(clips: pd.DataFrame) -> list:
+    """Lista serializable de los clips para el componente: video, inicio, fin y título."""
+    title_cols = [col for col in TITLE_COLUMNS if col in clips.columns]
+    titles = clips[title_cols].astype(str).agg(" | ".join, axis=1) if title_cols else pd.Series("", index=clips.index)
+    video_ids = clips["video_id"] if "video_id" in clips.columns else pd.Series(None, index=clips.index)
+    starts = pd.to_numeric(clips["Clip Start"], errors="coerce")
+    ends = pd.to_numeric(clips["Clip End"], errors="coerce") if "Clip End" in clips.columns else pd.Series(np.nan, index=clips.index)
+    return [
+        {
+            "video_id": video_id if isinstance(video_id, str) and video_id else None,
+            "start": _optional_float(start) or 0.0,
+            "end": _optional_float(end),
+            "title": title,
+        }
+        for video_id, start, end, title in zip(video_ids, starts, ends, titles)
+    ]
+
+
+def playlist_player(clips: pd.DataFrame, start_index: int = 0, start_token=0, key: str = "playlist_player", height: int = PLAYER_HEIGHT):
+    """
+    Reproduce la playlist completa en el navegador con la API IFrame de YouTube: busca el
+    inicio de cada clip, pasa al siguiente en su Clip End y reutiliza el reproductor cuando
+    clips seguidos son del mismo video. Avanzar o retroceder no ejecuta el script de nuevo.
+
+    Para saltar a `start_index` hay que cambiar `start_token` (p. ej. un contador por clic):
+    el navegador pudo avanzar por su cuenta, así que el índice solo no alcanza. Devuelve el índice en el que se
+    detuvo la playlist solo en el rerun que disparó el botón Detener; si no, None.
+    """
+    event = _playlist_component(
+        clips=playlist_clips(clips),
+        start_index=int(start_index),
+        start_token=start_token,
+        player_height=height,
+        key=key,
+        default=None,
+    )
+    if not event or event.get("action") != "stop":
+        return None
+    # El componente devuelve su último valor en todos los reruns: se procesa una sola vez
+    state_key = f"_last_playlist_event_{key}"
+    if st.session_state.get(state_key) == event.get("event_id"):
+        return None
+    st.session_state[state_key] = event.get("event_id")
+    return int(event.get("index", 0))
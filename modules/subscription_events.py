@@ -0,0 +1,94 @@
+# subscription_events.py
+
+import datetime
+import threading
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Código que devuelve Mongo cuando el servidor no es replica set (no soporta change streams).
+CHANGE_STREAM_NOT_SUPPORTED = 40573
+
+
+class SubscriptionWatcher:
+    """
+    Hilo único por proceso que escucha los cambios de la colección 'suscripciones' y los
+    publica con `on_change(user_email, status)`.
+
+    Usa un change stream de MongoDB (el upsert del webhook es el evento de activación). Si el
+    servidor no lo soporta, cae a consultar cada `poll_interval` segundos los documentos con
+    `updated_at` posterior al último visto (el webhook lo marca con $currentDate).
+    """
+
+    def __init__(self, collection, on_change, poll_interval=5.0):
+        self.collection = collection
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.mode = "change_stream"
+        self._watermark = None
+        self._resume_token = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="subscription-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _publish(self, doc):
+        if not doc or not doc.get("user_email"):
+            return
+        status = "active" if doc.get("status") == "active" else "inactive"
+        self.on_change(doc["user_email"], status)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.mode == "change_stream":
+                try:
+                    self._watch()
+                except (NotImplementedError, TypeError):
+                    # Dobles de prueba como mongomock no implementan watch()
+                    self.mode = "polling"
+                except OperationFailure as e:
+                    if e.code == CHANGE_STREAM_NOT_SUPPORTED:
+                        self.mode = "polling"
+                    else:
+                        print(f"Error en el change stream de suscripciones: {e}")
+                        self._stop.wait(self.poll_interval)
+                except PyMongoError as e:
+                    print(f"Error en el change stream de suscripciones: {e}")
+                    self._stop.wait(self.poll_interval)
+            else:
+                try:
+                    self._poll_once()
+                except PyMongoError as e:
+                    print(f"Error al consultar cambios de suscripciones: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        with self.collection.watch(
+            pipeline, full_document="updateLookup", resume_after=self._resume_token, max_await_time_ms=1000
+        ) as stream:
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    continue
+                self._resume_token = stream.resume_token
+                self._publish(change.get("fullDocument"))
+
+    def _poll_once(self):
+        if self._watermark is None:
+            # Primera consulta: solo se fija el punto de partida, la caché arranca vacía.
+            latest = self.collection.find_one(
+                {"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)]
+            )
+            self._watermark = latest["updated_at"] if latest else datetime.datetime.min
+            return
+        changes = self.collection.find(
+            {"updated_at": {"$gt": self._watermark}}, {"user_email": 1, "status": 1, "updated_at": 1}
+        )
+        for doc in changes:
+            self._publish(doc)
+            self._watermark = max(self._watermark, doc["updated_at"])
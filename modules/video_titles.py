@@ -0,0 +1,175 @@
+# video_titles.py
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+# Endpoint oEmbed (configurable para apuntar a un servidor local de prueba).
+OEMBED_ENDPOINT = os.environ.get("OEMBED_ENDPOINT", "https://www.youtube.com/oembed")
+OEMBED_TIMEOUT_SECONDS = float(os.environ.get("OEMBED_TIMEOUT_SECONDS", "5"))
+OEMBED_MAX_WORKERS = int(os.environ.get("OEMBED_MAX_WORKERS", "8"))
+# Tope total de espera por una carga: lo que no llegó a tiempo queda sin título y se guarda al llegar.
+OEMBED_DEADLINE_SECONDS = float(os.environ.get("OEMBED_DEADLINE_SECONDS", "2"))
+# Los títulos casi nunca cambian: se guardan una semana. Un video inexistente o privado, una hora.
+TITLE_TTL_HOURS = float(os.environ.get("VIDEO_TITLE_TTL_HOURS", "168"))
+MISSING_TTL_HOURS = 1.0
+
+CACHE_PATH = os.environ.get(
+    "VIDEO_TITLE_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "databasevideo_video_titles.json"),
+)
+TITLE_COLUMN = "video_title"
+
+_cache_lock = threading.Lock()
+_cache: Optional[dict] = None # video_id -> {"title": str | None, "fetched_at": float}
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def _get_session() -> requests.Session:
+    """Sesión HTTP compartida con un pool de conexiones del tamaño del paralelismo."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=OEMBED_MAX_WORKERS, pool_maxsize=OEMBED_MAX_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+# --- CACHÉ EN DISCO ---
+
+def _load_cache() -> dict:
+    # Se lee del disco una vez por proceso; después se usa la copia en memoria
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _is_fresh(entry: dict, now: float) -> bool:
+    ttl_hours = TITLE_TTL_HOURS if entry.get("title") is not None else MISSING_TTL_HOURS
+    return now - entry.get("fetched_at", 0) < ttl_hours * 3600
+
+
+def _save_entries(entries: dict):
+    """
+    Agrega `entries` a la caché y la reescribe. Antes de reemplazar el archivo se mezcla con
+    lo que haya en disco (otros procesos también lo escriben; gana la entrada más reciente)
+    y se descartan las vencidas, así el archivo no crece sin límite.
+    """
+    global _cache
+    with _cache_lock:
+        cache = dict(_load_cache())
+        try:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                on_disk = json.load(f)
+        except (OSError, ValueError):
+            on_disk = {}
+        for source in (on_disk, entries):
+            for video_id, entry in source.items():
+                if entry.get("fetched_at", 0) >= cache.get(video_id, {}).get("fetched_at", 0):
+                    cache[video_id] = entry
+        now = time.time()
+        _cache = {video_id: entry for video_id, entry in cache.items() if _is_fresh(entry, now)}
+
+        tmp_path = f"{CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(_cache, f)
+            os.replace(tmp_path, CACHE_PATH)
+        except OSError as e:
+            print(f"Error guardando la caché de títulos: {e}")
+
+
+# --- OEMBED ---
+
+def _fetch_title(video_id: str):
+    """
+    Título de un video por oEmbed. Devuelve (video_id, título); el título es None si el
+    video no existe o es privado, y la excepción se propaga si falló la red.
+    """
+    response = _get_session().get(
+        OEMBED_ENDPOINT,
+        params={"url": f"https://www.youtube.com/watch?v={video_id}", "format": "json"},
+        timeout=OEMBED_TIMEOUT_SECONDS,
+    )
+    if response.status_code in (401, 403, 404):
+        return video_id, None
+    response.raise_for_status()
+    return video_id, response.json().get("title")
+
+
+def _entry_from(future, fetched_at: float) -> dict:
+    try:
+        video_id, title = future.result()
+        return {video_id: {"title": title, "fetched_at": fetched_at}}
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Error obteniendo el título de YouTube: {e}")
+        return {}
+
+
+def _save_late_titles(futures):
+    # Una sola escritura del archivo para todos los pedidos que no llegaron al tope
+    wait(futures)
+    entries = {}
+    for future in futures:
+        entries.update(_entry_from(future, time.time()))
+    if entries:
+        _save_entries(entries)
+
+
+def fetch_titles(video_ids) -> dict:
+    """
+    Títulos de los video_id pedidos: los vigentes salen de la caché en disco y los demás se
+    consultan a oEmbed en paralelo, esperando como mucho OEMBED_DEADLINE_SECONDS en total.
+    Los errores de red no se guardan (se reintentan después).
+    """
+    wanted = {video_id for video_id in video_ids if isinstance(video_id, str) and video_id}
+    now = time.time()
+    with _cache_lock:
+        cache = _load_cache()
+        missing = [video_id for video_id in wanted if not (video_id in cache and _is_fresh(cache[video_id], now))]
+
+    if missing:
+        executor = ThreadPoolExecutor(max_workers=min(OEMBED_MAX_WORKERS, len(missing)))
+        futures = [executor.submit(_fetch_title, video_id) for video_id in missing]
+        done, pending = wait(futures, timeout=OEMBED_DEADLINE_SECONDS)
+        # No se espera a los pedidos atrasados: sus resultados se guardan juntos cuando lleguen
+        executor.shutdown(wait=False)
+        if pending:
+            threading.Thread(target=_save_late_titles, args=(pending,), name="video-titles-late", daemon=True).start()
+            print(f"Títulos de YouTube: {len(pending)} pedidos no respondieron en {OEMBED_DEADLINE_SECONDS:g} s.")
+
+        fetched = {}
+        for future in done:
+            fetched.update(_entry_from(future, now))
+        if fetched:
+            _save_entries(fetched)
+
+    with _cache_lock:
+        cache = _load_cache()
+        return {video_id: cache[video_id]["title"] for video_id in wanted if video_id in cache}
+
+
+def add_video_titles(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega la columna `video_title` resolviendo una sola vez cada video_id distinto."""
+    if "video_id" not in df.columns:
+        return df
+    titles = fetch_titles(pd.unique(df["video_id"].dropna()))
+    return df.assign(**{TITLE_COLUMN: df["video_id"].map(titles).astype("category")})
+
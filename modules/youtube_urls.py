@@ -0,0 +1,47 @@
+# youtube_urls.py
+
+import re
+import urllib.parse
+from typing import Optional
+
+import pandas as pd
+
+# ID de 11 caracteres en los formatos habituales: watch?v=, youtu.be/, shorts/, embed/, live/, v/
+VIDEO_ID_REGEX = (
+    r"(?:youtube(?:-nocookie)?\.com/(?:watch\?(?:[^#\s]*?&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)"
+    r"(?P<video_id>[A-Za-z0-9_-]{11})"
+)
+
+_VIDEO_ID_RE = re.compile(VIDEO_ID_REGEX)
+
+
+def extraer_video_id(url: str) -> Optional[str]:
+    """Extrae el ID de un video de YouTube de diferentes formatos de URL."""
+    if not isinstance(url, str):
+        return None
+    match = _VIDEO_ID_RE.search(url)
+    return match.group("video_id") if match else None
+
+
+def limpiar_url_youtube(url: str) -> str:
+    """Limpia la URL de YouTube para quitar parámetros innecesarios."""
+    video_id = extraer_video_id(url)
+    if not video_id and isinstance(url, str):
+        # Formatos no contemplados por la expresión regular (p. ej. parámetros raros)
+        parsed = urllib.parse.urlparse(url)
+        video_id = urllib.parse.parse_qs(parsed.query).get("v", [None])[0]
+    return f"https://www.youtube.com/watch?v={video_id}" if video_id else url
+
+
+def extraer_video_ids(urls: pd.Series) -> pd.Series:
+    """
+    `extraer_video_id` aplicado a una columna, sin una llamada de Python por fila: cada URL
+    distinta se procesa una sola vez y el resultado tiene el mismo índice que `urls`.
+    """
+    codes, uniques = pd.factorize(urls, use_na_sentinel=True)
+    distinct = pd.Series(uniques, dtype="object").astype("string")
+    video_ids = distinct.str.extract(VIDEO_ID_REGEX, expand=False)
+
+    # El código -1 (URL vacía) apunta a la fila extra con NA
+    video_ids = pd.concat([video_ids, pd.Series([pd.NA], dtype="string")], ignore_index=True)
+    return pd.Series(video_ids.to_numpy(dtype=object, na_value=None)[codes], index=urls.index, name="video_id")
@@ -0,0 +1,131 @@
+# yt_dlp_service.py
+
+import os
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Empty, LifoQueue
+
+import streamlit as st
+
+from modules.youtube_urls import extraer_video_id
+from modules.yt_dlp_updater import wait_for_upgrade
+
+# Perfiles de opciones de yt-dlp; cada uno tiene sus propias instancias precalentadas.
+PROFILES = {
+    "download_link": {
+        'format': 'best[ext=mp4]/best',
+        'quiet': True,
+        'no_warnings': True,
+    },
+}
+# Sin `expire` en la URL firmada, el resultado se guarda este tiempo (configurable).
+DEFAULT_TTL_SECONDS = float(os.environ.get("YT_DLP_INFO_TTL_SECONDS", "1800"))
+# Margen antes del vencimiento del enlace: no se entrega un enlace a punto de expirar.
+EXPIRE_MARGIN_SECONDS = 300
+CACHE_MAX_ENTRIES = 64
+
+
+def signed_url_expiry(info: dict):
+    """Menor `expire` (epoch) de las URLs firmadas del resultado, o None si no tienen."""
+    urls = [info.get("url")] + [fmt.get("url") for fmt in info.get("requested_formats") or []]
+    expiries = []
+    for url in urls:
+        if not url:
+            continue
+        expire = urllib.parse.parse_qs(urllib.parse.urlparse(url).query).get("expire", [None])[0]
+        if expire and expire.isdigit():
+            expiries.append(int(expire))
+    return min(expiries) if expiries else None
+
+
+class ExtractionService:
+    """
+    Extracción de yt-dlp con instancias de YoutubeDL reutilizadas y resultados en caché.
+
+    - Las instancias se crean una vez por perfil de opciones y vuelven a un pool al terminar
+      (YoutubeDL no es seguro entre hilos, así que cada extracción usa una instancia propia).
+    - Los resultados se guardan por (perfil, video_id) hasta poco antes del `expire` de la
+      URL firmada que devolvió YouTube.
+    - Pedidos simultáneos del mismo video esperan a una única extracción.
+    """
+
+    def __init__(self, profiles: dict = None):
+        self.profiles = profiles or PROFILES
+        self._pools = {name: LifoQueue() for name in self.profiles}
+        self._lock = threading.Lock()
+        self._cache = OrderedDict() # (perfil, video_id) -> (info, vence_en)
+        self._inflight = {} # (perfil, video_id) -> Future de la extracción en curso
+
+    def _acquire(self, profile: str):
+        try:
+            return self._pools[profile].get_nowait()
+        except Empty:
+            from yt_dlp import YoutubeDL # Recién acá: nunca mientras pip reescribe el paquete
+            return YoutubeDL(dict(self.profiles[profile]))
+
+    def _release(self, profile: str, ydl):
+        self._pools[profile].put(ydl)
+
+    def _extract(self, profile: str, url: str) -> dict:
+        # yt-dlp carga extractores bajo demanda: se espera a la actualización en cada extracción
+        wait_for_upgrade()
+        ydl = self._acquire(profile)
+        try:
+            return ydl.extract_info(url, download=False)
+        finally:
+            self._release(profile, ydl)
+
+    def _expires_at(self, info: dict, now: float) -> float:
+        expire = signed_url_expiry(info)
+        if expire is None:
+            return now + DEFAULT_TTL_SECONDS
+        return expire - EXPIRE_MARGIN_SECONDS
+
+    def get_info(self, video_url: str, profile: str = "download_link") -> dict:
+        """`extract_info(download=False)` del video, desde la caché si el enlace sigue vigente."""
+        video_id = extraer_video_id(video_url)
+        key = (profile, video_id or video_url)
+        url = f"https://www.youtube.com/watch?v={video_id}" if video_id else video_url
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] > time.time():
+                self._cache.move_to_end(key)
+                return cached[0]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            info = self._extract(profile, url)
+            with self._lock:
+                self._cache[key] = (info, self._expires_at(info, time.time()))
+                while len(self._cache) > CACHE_MAX_ENTRIES:
+                    self._cache.popitem(last=False)
+            future.set_result(info)
+            return info
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def invalidate(self, video_url: str, profile: str = "download_link"):
+        video_id = extraer_video_id(video_url)
+        with self._lock:
+            self._cache.pop((profile, video_id or video_url), None)
+
+
+@st.cache_resource(show_spinner=False)
+def get_extraction_service() -> ExtractionService:
+    """Servicio compartido por todas las sesiones del proceso."""
+    return ExtractionService()
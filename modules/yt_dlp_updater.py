@@ -0,0 +1,144 @@
+# yt_dlp_updater.py
+
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from importlib import metadata
+from typing import Optional
+
+# Cada cuántas horas se permite intentar actualizar yt-dlp (configurable por variable de entorno).
+UPDATE_TTL_HOURS = float(os.environ.get("YT_DLP_UPDATE_TTL_HOURS", "24"))
+# Tiempo máximo que puede tardar pip antes de abandonar el intento.
+PIP_TIMEOUT_SECONDS = 120
+
+STAMP_PATH = os.environ.get(
+    "YT_DLP_UPDATE_STAMP",
+    os.path.join(tempfile.gettempdir(), "databasevideo_yt_dlp_update.json"),
+)
+
+_update_lock = threading.Lock()
+_update_thread: Optional[threading.Thread] = None
+# Sin actualización en curso está activo; mientras pip reescribe el paquete, no.
+_upgrade_done = threading.Event()
+_upgrade_done.set()
+
+
+def installed_version() -> Optional[str]:
+    """Versión de yt-dlp instalada actualmente (leída del disco, no del módulo importado)."""
+    try:
+        return metadata.version("yt-dlp")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def read_stamp() -> dict:
+    try:
+        with open(STAMP_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_stamp(data: dict):
+    tmp_path = f"{STAMP_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, STAMP_PATH)
+
+
+def is_update_due(now: Optional[float] = None) -> bool:
+    """True si el último intento de actualización es más viejo que el TTL."""
+    checked_at = read_stamp().get("checked_at", 0)
+    now = time.time() if now is None else now
+    return now - checked_at >= UPDATE_TTL_HOURS * 3600
+
+
+def upgrade_yt_dlp() -> dict:
+    """Ejecuta `pip install --upgrade yt-dlp` de forma bloqueante y registra el resultado."""
+    previous_version = installed_version()
+    # Se marca el intento antes de correr pip para que otros procesos no lo repitan en paralelo.
+    _write_stamp({**read_stamp(), "checked_at": time.time()})
+
+    started = time.perf_counter()
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "pip", "install", "--upgrade", "--quiet", "yt-dlp"],
+            check=True, capture_output=True, timeout=PIP_TIMEOUT_SECONDS,
+        )
+        error = None
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        error = str(e)
+        print(f"Error updating yt-dlp: {e}")
+
+    result = {
+        "checked_at": time.time(),
+        "checked_at_iso": datetime.datetime.now().isoformat(timespec="seconds"),
+        "previous_version": previous_version,
+        "version": installed_version(),
+        "duration_s": round(time.perf_counter() - started, 2),
+        "error": error,
+    }
+    _write_stamp(result)
+    return result
+
+
+def _run_upgrade():
+    try:
+        upgrade_yt_dlp()
+    finally:
+        _upgrade_done.set()
+
+
+def wait_for_upgrade(timeout: float = PIP_TIMEOUT_SECONDS) -> bool:
+    """
+    Espera a que termine la actualización en segundo plano, si hay una en curso. Las páginas
+    lo llaman antes de importar o ejecutar yt-dlp para no usar un paquete a medio escribir.
+    """
+    return _upgrade_done.wait(timeout)
+
+
+def schedule_upgrade() -> bool:
+    """
+    Lanza la actualización en un hilo en segundo plano si el TTL venció.
+    Nunca bloquea: devuelve True si se lanzó un hilo nuevo.
+    """
+    global _update_thread
+    with _update_lock:
+        if _update_thread is not None and _update_thread.is_alive():
+            return False
+        if not is_update_due():
+            return False
+        _upgrade_done.clear()
+        _update_thread = threading.Thread(target=_run_upgrade, name="yt-dlp-updater", daemon=True)
+        _update_thread.start()
+        return True
+
+
+def measure_startup() -> dict:
+    """
+    Compara el costo en el camino de arranque de la actualización bloqueante (comportamiento
+    anterior de app.py) contra schedule_upgrade(), que solo consulta el TTL.
+    """
+    started = time.perf_counter()
+    upgrade_yt_dlp()
+    blocking_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    schedule_upgrade()  # El stamp recién escrito hace que solo se consulte el TTL
+    scheduled_s = time.perf_counter() - started
+    return {"blocking_upgrade_s": round(blocking_s, 3), "scheduled_upgrade_s": round(scheduled_s, 6)}
+
+
+if __name__ == "__main__":
+    # Punto de entrada de mantenimiento (cron, deploy hook):
+    #   python -m modules.yt_dlp_updater            -> actualiza ahora y muestra el resultado
+    #   python -m modules.yt_dlp_updater --measure  -> mide el arranque con y sin actualización bloqueante
+    if "--measure" in sys.argv:
+        print(json.dumps(measure_startup(), indent=2))
+    else:
+        print(json.dumps(upgrade_yt_dlp(), indent=2))
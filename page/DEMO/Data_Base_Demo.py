@@ -1,34 +1,18 @@
 # Force redeploy
 import streamlit as st
 import pandas as pd
+import numpy as np
 import requests
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-from typing import Optional
 
-# --- FUNCIONES DE UTILIDAD ---
-
-def obtener_titulo_youtube(url: str) -> str:
-    """Obtiene el título de un video de YouTube a partir de su URL."""
-    try:
-        oembed_url = f"https://www.youtube.com/oembed?url={url}&format=json"
-        response = requests.get(oembed_url)
-        response.raise_for_status()
-        return response.json().get("title", "🎬 Sin título")
-    except requests.exceptions.RequestException:
-        return "⚠️ No se pudo obtener el título"
-
-def extraer_video_id(url: str) -> Optional[str]:
-    """Extrae el ID de un video de YouTube de diferentes formatos de URL."""
-    if not isinstance(url, str):
-        return None
-    try:
-        if "watch?v=" in url:
-            return url.split("watch?v=")[1].split("&")[0]
-        if "youtu.be/" in url:
-            return url.split("youtu.be/")[1].split("?")[0]
-    except IndexError:
-        return None
-    return None
+from modules.aggregates import get_aggregate_cube
+from modules.auth_google import is_admin
+from modules.clip_ingest import load_clips_csv, uses_csv_urls
+from modules.filter_engine import FilterEngine, get_filter_engine
+from modules.frame_memory import session_memory_report
+from modules.grid_edits import apply_cell_edits, extract_cell_edits
+from modules.paged_grid import render_page_controls, render_paged_grid
+from modules.playlist_player import playlist_player
+from modules.video_titles import add_video_titles
 
 # --- GESTIÓN DE ESTADO ---
 
@@ -36,10 +20,10 @@ def inicializar_estado():
     """Inicializa todas las variables necesarias en el session_state de Streamlit."""
     if "df_original" not in st.session_state:
         st.session_state.df_original = None
-    if "df_filtrado" not in st.session_state:
-        st.session_state.df_filtrado = pd.DataFrame()
-    if "clips_seleccionados" not in st.session_state:
-        st.session_state.clips_seleccionados = pd.DataFrame()
+    if "filtro_posiciones" not in st.session_state:
+        st.session_state.filtro_posiciones = None # Filas filtradas (posiciones), no una copia
+    if "clips_seleccionados_idx" not in st.session_state:
+        st.session_state.clips_seleccionados_idx = np.array([], dtype=object) # Índices seleccionados
     if "playlist_index" not in st.session_state:
         st.session_state.playlist_index = 0
     if "playlist_active" not in st.session_state:
@@ -59,58 +43,30 @@ def load_demo_data():
     
     try:
         # Try to load from local path first
-        df = pd.read_csv(local_csv_path, sep=None, engine="python")
+        with open(local_csv_path, "rb") as f:
+            data = f.read()
         st.success("✅ CSV de demostración cargado localmente.")
     except FileNotFoundError:
         try:
             # If local file not found, load from remote URL
-            df = pd.read_csv(remote_csv_url, sep=None, engine="python")
+            response = requests.get(remote_csv_url, timeout=15)
+            response.raise_for_status()
+            data = response.content
             st.success("✅ CSV de demostración cargado desde GitHub.")
         except Exception as e:
             st.error(f"❌ Error al cargar el CSV de demostración: {e}")
             return
+
+    try:
+        # Parseo y normalización compartidos con Data_Base, cacheados por el hash del contenido
+        _, df = load_clips_csv(data)
+        df = add_video_titles(df) # Un pedido por video distinto, en paralelo y con caché en disco
     except Exception as e:
         st.error(f"❌ Error al procesar el CSV: {e}")
         return
 
-    # --- Lógica de mapeo de columnas flexible y insensible a mayúsculas ---
-    original_cols = {col.strip(): col for col in df.columns}
-    df.rename(columns={v: k for k, v in original_cols.items()}, inplace=True)
-    lower_case_map = {col.lower(): col for col in df.columns}
-    column_mapping = {
-        'Row Name': ['row name', 'code'],
-        'Clip Start': ['clip start', 'start'],
-        'Clip End': ['clip end', 'stop', 'end'],
-        'EQUIPO': ['equipo'],
-        'JUGADOR': ['jugador', 'player'],
-        'RESULTADO': ['resultado', 'result'],
-        'FORM': ['form', 'formacion']
-    }
-    rename_final = {}
-    for standard_name, possible_names in column_mapping.items():
-        for name in possible_names:
-            if name in lower_case_map:
-                rename_final[lower_case_map[name]] = standard_name
-                break
-    df.rename(columns=rename_final, inplace=True)
-
-    # --- Procesamiento de datos ---
-    if 'EQUIPO' not in df.columns:
-        df['EQUIPO'] = 'N/A'
-    df['EQUIPO'].fillna('N/A', inplace=True)
-
-    df["Clip Start"] = pd.to_numeric(df["Clip Start"], errors='coerce')
-    df["Clip End"] = pd.to_numeric(df["Clip End"], errors='coerce')
-    df.dropna(subset=["Clip Start", "Clip End"], inplace=True)
-    df["duracion"] = (df["Clip End"] - df["Clip Start"]).round(0)
-
-    if "URL" in df.columns and df["URL"].notna().any():
-        df["video_id"] = df["URL"].str.strip().apply(extraer_video_id)
+    if uses_csv_urls(df):
         st.success("✅ Se usaron URLs individuales del CSV.")
-    else:
-        # In demo mode, we can't ask for a URL, so we should handle this case
-        # For now, let's assume the CSV will always have the URL
-        pass
 
     st.session_state.df_original = df
     st.session_state.new_file_loaded = True
@@ -127,6 +83,7 @@ def render_sidebar():
         # --- Filtros Dinámicos ---
         st.header("📊 Filtros Dinámicos")
         df = st.session_state.df_original
+        engine = get_filter_engine(df) # Índices construidos una vez por archivo cargado
         
         if 'dynamic_filters' not in st.session_state:
             st.session_state.dynamic_filters = {}
@@ -138,33 +95,19 @@ def render_sidebar():
                     continue
 
                 # Filtro para columnas categóricas (texto con pocas opciones)
-                if df[col].dtype == 'object' and df[col].nunique() > 1 and df[col].nunique() < 50:
-                    options = df[col].dropna().unique().tolist()
-                    try:
-                        options.sort()
-                    except TypeError:
-                        pass 
-                    
+                if engine.is_categorical(col):
+                    options = engine.options(col)
                     default = st.session_state.dynamic_filters.get(col, options)
                     st.session_state.dynamic_filters[col] = st.multiselect(f"Filtrar {col}", options, default=default)
                 
                 # Filtro para columnas numéricas
-                elif pd.api.types.is_numeric_dtype(df[col].dtype) and df[col].nunique() > 1:
-                    min_val, max_val = float(df[col].min()), float(df[col].max())
+                elif engine.is_numeric(col):
+                    min_val, max_val = engine.value_range(col)
                     default = st.session_state.dynamic_filters.get(col, (min_val, max_val))
                     st.session_state.dynamic_filters[col] = st.slider(f"Rango {col}", min_val, max_val, value=default)
 
-        # Aplicar filtros guardados en el estado
-        df_filtrado = df.copy()
-        for col, value in st.session_state.get('dynamic_filters', {}).items():
-            if col not in df_filtrado.columns: continue
-            
-            if isinstance(value, list): # Filtro de Multiselect
-                df_filtrado = df_filtrado[df_filtrado[col].isin(value)]
-            elif isinstance(value, tuple): # Filtro de Slider
-                df_filtrado = df_filtrado[df_filtrado[col].between(value[0], value[1])]
-        
-        st.session_state.df_filtrado = df_filtrado
+        # Aplicar filtros guardados en el estado (listas = multiselect, tuplas = slider)
+        st.session_state.filtro_posiciones = engine.positions(st.session_state.get('dynamic_filters', {}))
 
         st.divider()
         st.header("👁️ Columnas Visibles")
@@ -180,11 +123,24 @@ def render_sidebar():
             default=st.session_state.get('columnas_visibles', all_columns)
         )
 
+        if is_admin(getattr(st.user, "email", None)):
+            with st.expander("🧠 Memoria de la sesión"):
+                reporte = session_memory_report(st.session_state)
+                st.dataframe(reporte[["objeto", "MB"]], hide_index=True)
+                st.caption(f"Total: {reporte['MB'].sum():.2f} MB")
+
+def obtener_clips_seleccionados() -> pd.DataFrame:
+    """Filas completas de los clips seleccionados en la tabla (se guardan solo sus índices)."""
+    df = st.session_state.df_original
+    if df is None:
+        return pd.DataFrame()
+    seleccion = pd.Index(st.session_state.get("clips_seleccionados_idx", []))
+    return df.loc[seleccion[seleccion.isin(df.index)]]
+
 def render_aggrid(height=400):
     """Muestra la tabla de clips interactiva y maneja la selección y edición."""
-    df_display = st.session_state.df_filtrado.copy()
-
-    if df_display.empty:
+    posiciones = st.session_state.get("filtro_posiciones")
+    if posiciones is None or len(posiciones) == 0:
         st.info("No hay clips para mostrar con los filtros actuales.")
         return
 
@@ -193,102 +149,76 @@ def render_aggrid(height=400):
         st.warning("👈 Selecciona al menos una columna para mostrar.")
         return
 
-    df_display_final = df_display[columnas_visibles]
-    
-    gb = GridOptionsBuilder.from_dataframe(df_display_final)
-    gb.configure_selection("multiple", use_checkbox=True, header_checkbox=True)
-    
-    # Permitir edición en todas las columnas visibles
-    for col in columnas_visibles:
-        gb.configure_column(col, editable=True)
-
-    grid_options = gb.build()
-    grid_response = AgGrid(
-        df_display_final, 
-        gridOptions=grid_options, 
-        update_mode=GridUpdateMode.MODEL_CHANGED, 
-        theme="streamlit", 
+    # Solo viaja al navegador la página actual; el orden y los filtros se resuelven en pandas.
+    df = st.session_state.df_original
+    filters = st.session_state.get('dynamic_filters', {})
+    sort_column, ascending, start, stop, page_key = render_page_controls(
+        columnas_visibles, len(posiciones), "grid_data_base", FilterEngine.state_key(filters)
+    )
+    page_positions = get_filter_engine(df).sorted_positions(filters, sort_column, ascending)[start:stop]
+    grid_response, df_display_final = render_paged_grid(
+        df,
+        page_positions,
+        columnas_visibles,
+        key=f"aggrid_data_base_{page_key}",
+        selection_key="clips_seleccionados_idx",
+        editable_columns=columnas_visibles, # Permitir edición en todas las columnas visibles
         height=height,
-        key="aggrid_data_base",
-        reload_data=False
     )
-    
-    st.session_state.clips_seleccionados = pd.DataFrame(grid_response.get("selected_rows", []))
-    
-    if grid_response['data'] is not None:
-        df_updated_view = pd.DataFrame(grid_response['data'])
-        if len(df_updated_view) == len(df_display_final):
-            df_updated_view.index = df_display_final.index
-            st.session_state.df_original.update(df_updated_view)
-            st.session_state.df_filtrado.update(df_updated_view)
-
-
-def render_player_frame(clip_info: pd.Series, autoplay: bool = True):
-    """Muestra el reproductor de video de YouTube para un clip específico."""
-    video_id = clip_info.get("video_id")
-    if not video_id:
-        st.warning("No se pudo encontrar el ID del video para este clip.")
-        return
-    start_time = int(clip_info["Clip Start"])
-    autoplay_param = "1" if autoplay else "0"
-    embed_url = f"https://www.youtube.com/embed/{video_id}?start={start_time}&autoplay={autoplay_param}&rel=0"
-    
-    # Aumentamos la altura del reproductor para aprovechar mejor la pantalla
-    player_height = 650 # Originalmente 450
-    component_height = player_height + 20 # Espacio adicional para el componente
 
-    st.components.v1.html(
-        f'<div class="video-container"><iframe src="{embed_url}" width="100%" height="{player_height}" frameborder="0" allow="autoplay; encrypted-media" allowfullscreen></iframe></div>',
-        height=component_height
-    )
+    # Solo se escriben las celdas editadas; en los demás reruns no se toca ningún DataFrame.
+    edits = extract_cell_edits(grid_response, df_display_final, columnas_visibles, "aggrid_data_base")
+    if edits:
+        apply_cell_edits(edits, st.session_state.df_original)
+        columnas_editadas = {edit.column for edit in edits}
+        get_filter_engine(st.session_state.df_original).invalidate(columnas_editadas)
+        get_aggregate_cube(st.session_state.df_original).invalidate(columnas_editadas)
+
 
 # --- SECCIÓN DE GRÁFICOS DINÁMICOS ---
 
-def render_event_frequency_chart(df):
-    if 'Row Name' in df.columns and 'EQUIPO' in df.columns:
+def render_event_frequency_chart(cube, counts):
+    if cube.has('Row Name', 'EQUIPO'):
         st.markdown("#### Frecuencia de Eventos por Equipo")
         try:
-            chart_data = df.groupby(['EQUIPO', 'Row Name']).size().unstack(fill_value=0)
+            chart_data = cube.pivot(counts, 'EQUIPO', 'Row Name')
             st.bar_chart(chart_data)
             st.caption("Muestra el número de veces que ocurre cada evento, agrupado por equipo.")
         except Exception as e:
             st.warning(f"No se pudo generar el gráfico de frecuencia: {e}")
         st.divider()
 
-def render_result_distribution_chart(df):
-    if 'RESULTADO' in df.columns and 'EQUIPO' in df.columns:
+def render_result_distribution_chart(cube, counts):
+    if cube.has('RESULTADO', 'EQUIPO'):
         st.markdown("#### Distribución de Resultados por Equipo")
-        df_chart = df.dropna(subset=['RESULTADO'])
-        if not df_chart.empty:
-            try:
-                chart_data = df_chart.groupby(['EQUIPO', 'RESULTADO']).size().unstack(fill_value=0)
+        try:
+            chart_data = cube.pivot(counts, 'EQUIPO', 'RESULTADO')
+            if not chart_data.empty:
                 st.bar_chart(chart_data)
                 st.caption("Muestra la cantidad de resultados (ej: GANO, PERDIO) para cada equipo.")
-            except Exception as e:
-                st.warning(f"No se pudo generar el gráfico de resultados: {e}")
-        else:
-            st.info("No hay datos en la columna 'RESULTADO' para graficar.")
+            else:
+                st.info("No hay datos en la columna 'RESULTADO' para graficar.")
+        except Exception as e:
+            st.warning(f"No se pudo generar el gráfico de resultados: {e}")
         st.divider()
 
-def render_lineout_charts(df):
-    if 'Row Name' in df.columns and df['Row Name'].str.contains('LINEOUT', case=False, na=False).any():
-        lineout_df = df[df['Row Name'].str.contains('LINEOUT', case=False, na=False)].copy()
+def render_lineout_charts(cube, counts):
+    if cube.has('Row Name') and cube.total(counts, where=['_lineout']) > 0:
         st.markdown("### Análisis de Lineouts")
 
-        if 'FORM' in lineout_df.columns:
+        if cube.has('FORM'):
             st.markdown("##### Formaciones de Lineout")
-            form_counts = lineout_df['FORM'].value_counts()
+            form_counts = cube.value_counts(counts, 'FORM', where=['_lineout'])
             if not form_counts.empty:
                 st.bar_chart(form_counts)
                 st.caption("Frecuencia de las formaciones ('FORM') en los lineouts.")
             else:
                 st.info("No hay datos en 'FORM' para los lineouts.")
 
-        if 'JUGADOR' in lineout_df.columns and 'RESULTADO' in lineout_df.columns:
+        if cube.has('JUGADOR', 'RESULTADO'):
             st.markdown("##### Jugadores con más Lineouts Ganados")
-            won_lineouts = lineout_df[lineout_df['RESULTADO'].str.contains('GANO|WIN', case=False, na=False)]
-            if not won_lineouts.empty:
-                player_wins = won_lineouts['JUGADOR'].value_counts()
+            if cube.total(counts, where=['_lineout', '_win']) > 0:
+                player_wins = cube.value_counts(counts, 'JUGADOR', where=['_lineout', '_win'])
                 if not player_wins.empty:
                     st.bar_chart(player_wins)
                     st.caption("Número de lineouts ganados por jugador.")
@@ -300,7 +230,7 @@ def render_lineout_charts(df):
 
 def render_analysis_section():
     """Muestra el expander con gráficos dinámicos y contexto."""
-    df_filtrado = st.session_state.get("df_filtrado", pd.DataFrame())
+    posiciones = st.session_state.get("filtro_posiciones")
 
     with st.expander("📊 Gráficos y Contexto del Análisis", expanded=False):
         st.subheader("📝 Añadir Contexto al Análisis")
@@ -313,13 +243,19 @@ def render_analysis_section():
         st.divider()
         st.subheader("📈 Gráficos de Análisis")
 
-        if df_filtrado.empty:
+        if posiciones is None or len(posiciones) == 0:
             st.info("Carga y filtra datos para ver los gráficos.")
             return
 
-        render_event_frequency_chart(df_filtrado)
-        render_result_distribution_chart(df_filtrado)
-        render_lineout_charts(df_filtrado)
+        # Conteos por celda del cubo para el estado de filtros actual (memoizados)
+        df = st.session_state.df_original
+        filters = st.session_state.get('dynamic_filters', {})
+        cube = get_aggregate_cube(df)
+        counts = cube.counts(get_filter_engine(df).positions(filters), FilterEngine.state_key(filters))
+
+        render_event_frequency_chart(cube, counts)
+        render_result_distribution_chart(cube, counts)
+        render_lineout_charts(cube, counts)
 
 # --- VISTA PRINCIPAL ---
 
@@ -330,7 +266,7 @@ def render_main_view():
     
     render_aggrid()
 
-    clips_seleccionados = st.session_state.get("clips_seleccionados", pd.DataFrame())
+    clips_seleccionados = obtener_clips_seleccionados()
     is_playlist_empty = clips_seleccionados.empty
 
     # --- Lógica de validación para el índice de la playlist ---
@@ -346,39 +282,25 @@ def render_main_view():
             st.info("La selección de clips cambió. La playlist continuará desde el inicio de la nueva selección.")
 
     # --- Controles de la Playlist ---
-    cols = st.columns([1.5, 1, 1, 1, 1.5, 2])
+    cols = st.columns([1.5, 1, 4.5])
 
-    if cols[0].button("▶️ Iniciar Playlist", disabled=is_playlist_empty):
+    if cols[0].button("▶️ Iniciar Playlist", disabled=is_playlist_empty or st.session_state.playlist_active):
         st.session_state.playlist_active = True
         st.session_state.playlist_index = 0
         st.rerun()
 
-    if cols[1].button("⏪ Anterior", disabled=not st.session_state.playlist_active):
-        if st.session_state.playlist_index > 0:
-            st.session_state.playlist_index -= 1
-            st.rerun()
-
-    if cols[2].button("⏩ Próximo", disabled=not st.session_state.playlist_active):
-        if st.session_state.playlist_index < len(clips_seleccionados) - 1:
-            st.session_state.playlist_index += 1
-            st.rerun()
-
-    if cols[3].button("🛑 Detener", disabled=not st.session_state.playlist_active):
+    if cols[1].button("🛑 Detener", disabled=not st.session_state.playlist_active):
         st.session_state.playlist_active = False
         st.rerun()
 
-    if st.session_state.playlist_active and not is_playlist_empty:
-        cols[5].info(f"**Clip {st.session_state.playlist_index + 1} de {len(clips_seleccionados)}**")
-
     # --- Reproductor de Video ---
+    # La playlist avanza en el navegador (anterior/próximo, Clip End): no hay reruns por clip
     if st.session_state.playlist_active and not is_playlist_empty:
-        # El índice ya ha sido validado, por lo que esta línea ahora es segura
-        clip_to_show = clips_seleccionados.iloc[st.session_state.playlist_index]
-        
-        title_cols = [c for c in ["Row Name", "EQUIPO", "JUGADOR", "RESULTADO"] if c in clip_to_show]
-        st.markdown(f"### " + " | ".join([str(clip_to_show[c]) for c in title_cols]))
-        
-        render_player_frame(clip_to_show, autoplay=True)
+        detenido_en = playlist_player(clips_seleccionados, start_index=st.session_state.playlist_index)
+        if detenido_en is not None:
+            st.session_state.playlist_active = False
+            st.session_state.playlist_index = detenido_en
+            st.rerun()
     
     st.divider()
     render_analysis_section()
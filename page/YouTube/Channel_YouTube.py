@@ -4,6 +4,8 @@ import json
 import pandas as pd
 import shutil
 
+from modules.yt_dlp_updater import wait_for_upgrade
+
 def run_channel_youtube_page():
     st.title("📥 Extraer URLs de un Canal de YouTube")
     canal_input = st.text_input("📎 Canal de YouTube", placeholder="https://www.youtube.com/@unionargentinaderugby")
@@ -14,6 +16,7 @@ def run_channel_youtube_page():
             st.error("❌ yt-dlp no está instalado.")
             st.stop()
 
+        wait_for_upgrade() # No ejecutar yt-dlp mientras se actualiza en segundo plano
         result = subprocess.run(
             [yt_dlp, "--flat-playlist", "-J", canal_input],
             capture_output=True, text=True
@@ -1,34 +1,20 @@
 # Force redeploy
 import streamlit as st
 import pandas as pd
-import requests
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-from typing import Optional
-
-# --- FUNCIONES DE UTILIDAD ---
-
-def obtener_titulo_youtube(url: str) -> str:
-    """Obtiene el título de un video de YouTube a partir de su URL."""
-    try:
-        oembed_url = f"https://www.youtube.com/oembed?url={url}&format=json"
-        response = requests.get(oembed_url)
-        response.raise_for_status()
-        return response.json().get("title", "🎬 Sin título")
-    except requests.exceptions.RequestException:
-        return "⚠️ No se pudo obtener el título"
-
-def extraer_video_id(url: str) -> Optional[str]:
-    """Extrae el ID de un video de YouTube de diferentes formatos de URL."""
-    if not isinstance(url, str):
-        return None
-    try:
-        if "watch?v=" in url:
-            return url.split("watch?v=")[1].split("&")[0]
-        if "youtu.be/" in url:
-            return url.split("youtu.be/")[1].split("?")[0]
-    except IndexError:
-        return None
-    return None
+import numpy as np
+
+from modules.aggregates import get_aggregate_cube
+from modules.auth_google import is_admin
+from modules.clip_ingest import load_clips_csv, uploaded_file_hash, uses_csv_urls
+from modules.clip_store import default_dataset_name, delete_dataset, list_datasets, load_dataset, save_dataset
+from modules.clip_warehouse import get_clip_warehouse
+from modules.filter_engine import FilterEngine, get_filter_engine
+from modules.frame_memory import session_memory_report
+from modules.grid_edits import apply_cell_edits, extract_cell_edits
+from modules.paged_grid import render_page_controls, render_paged_grid
+from modules.playlist_player import playlist_player
+from modules.video_titles import TITLE_COLUMN, add_video_titles, fetch_titles
+from modules.youtube_urls import extraer_video_id
 
 # --- GESTIÓN DE ESTADO ---
 
@@ -38,10 +24,10 @@ def inicializar_estado():
         st.session_state.youtube_url = "https://www.youtube.com/watch?v=XNaqqZNJUMc"
     if "df_original" not in st.session_state:
         st.session_state.df_original = None
-    if "df_filtrado" not in st.session_state:
-        st.session_state.df_filtrado = pd.DataFrame()
-    if "clips_seleccionados" not in st.session_state:
-        st.session_state.clips_seleccionados = pd.DataFrame()
+    if "filtro_posiciones" not in st.session_state:
+        st.session_state.filtro_posiciones = None # Filas filtradas (posiciones), no una copia
+    if "clips_seleccionados_idx" not in st.session_state:
+        st.session_state.clips_seleccionados_idx = np.array([], dtype=object) # Índices seleccionados
     if "playlist_index" not in st.session_state:
         st.session_state.playlist_index = 0
     if "playlist_active" not in st.session_state:
@@ -54,6 +40,89 @@ def inicializar_estado():
         st.session_state.data_context = ""
     if "new_file_loaded" not in st.session_state:
         st.session_state.new_file_loaded = False
+    if "dataset_activo" not in st.session_state:
+        st.session_state.dataset_activo = None # Nombre del dataset guardado que se está editando
+    if "uploader_version" not in st.session_state:
+        st.session_state.uploader_version = 0
+    if "almacen_partidos" not in st.session_state:
+        st.session_state.almacen_partidos = None # match_id consultados en el almacén (modo temporada)
+
+
+def usuario_actual():
+    return getattr(st.user, "email", None)
+
+
+def activar_dataset(df: pd.DataFrame, csv_hash: str, nombre=None):
+    """Deja `df` como dataset de la sesión y reinicia filtros, columnas y selección."""
+    st.session_state.df_original = df
+    st.session_state.csv_hash = csv_hash
+    st.session_state.dataset_activo = nombre
+    st.session_state.new_file_loaded = True
+    st.session_state.dynamic_filters = {} # Reinicia los filtros para el nuevo archivo
+    st.session_state.clips_seleccionados_idx = np.array([], dtype=object)
+    st.session_state.almacen_partidos = None
+
+
+def filtros_locales() -> dict:
+    """Filtros a aplicar en pandas: en modo temporada ya los resolvió la consulta SQL."""
+    if st.session_state.get("almacen_partidos"):
+        return {}
+    return st.session_state.get('dynamic_filters', {})
+
+
+def guardar_dataset_activo():
+    """Vuelve a guardar el dataset abierto (p. ej. después de editar celdas)."""
+    email, nombre = usuario_actual(), st.session_state.get("dataset_activo")
+    if not email or not nombre or st.session_state.df_original is None:
+        return
+    try:
+        save_dataset(email, nombre, st.session_state.df_original, csv_hash=st.session_state.get("csv_hash"))
+    except Exception as e:
+        print(f"Error guardando el dataset {nombre}: {e}")
+
+
+def render_dataset_store(uploaded_file):
+    """Datasets guardados del usuario: guardar el actual, abrir o eliminar uno anterior."""
+    email = usuario_actual()
+    if not email:
+        return
+    st.divider()
+    st.subheader("💾 Mis datasets")
+
+    if st.session_state.df_original is not None:
+        sugerido = st.session_state.dataset_activo or default_dataset_name(getattr(uploaded_file, "name", None))
+        nombre = st.text_input("Nombre del dataset", value=sugerido)
+        if st.button("Guardar dataset", use_container_width=True) and nombre.strip():
+            try:
+                save_dataset(email, nombre, st.session_state.df_original, csv_hash=st.session_state.get("csv_hash"))
+                st.session_state.dataset_activo = nombre.strip()
+                st.success(f"✅ Dataset '{nombre.strip()}' guardado.")
+            except Exception as e:
+                st.error(f"❌ Error al guardar el dataset: {e}")
+
+    guardados = list_datasets(email)
+    if not guardados:
+        st.caption("Todavía no hay datasets guardados.")
+        return
+    etiquetas = {
+        f"{meta['name']} · {meta.get('rows', '?')} clips · {meta.get('saved_at', '')[:16].replace('T', ' ')}": meta["name"]
+        for meta in guardados
+    }
+    elegido = etiquetas[st.selectbox("Datasets guardados", list(etiquetas))]
+    col_abrir, col_eliminar = st.columns(2)
+    if col_abrir.button("Abrir", use_container_width=True):
+        try:
+            df, meta = load_dataset(email, elegido)
+            activar_dataset(df, meta.get("csv_hash") or f"store:{elegido}", nombre=elegido)
+            st.session_state.uploader_version += 1 # Vacía el uploader para que no pise el dataset abierto
+            st.rerun()
+        except Exception as e:
+            st.error(f"❌ Error al abrir el dataset: {e}")
+    if col_eliminar.button("Eliminar", use_container_width=True):
+        delete_dataset(email, elegido)
+        if st.session_state.dataset_activo == elegido:
+            st.session_state.dataset_activo = None
+        st.rerun()
 
 
 def render_sidebar():
@@ -62,106 +131,61 @@ def render_sidebar():
         st.subheader("Cargar CSV y URL de YouTube")
         st.session_state.youtube_url = st.text_input("🔗 URL YouTube", value=st.session_state.youtube_url)
 
-        uploaded_file = st.file_uploader("📂 Cargar CSV", type=["csv"])
+        uploaded_file = st.file_uploader("📂 Cargar CSV", type=["csv"], key=f"csv_uploader_{st.session_state.uploader_version}")
         if uploaded_file:
             try:
-                df = pd.read_csv(uploaded_file, sep=None, engine="python")
-                
-                # --- Lógica de mapeo de columnas flexible y insensible a mayúsculas ---
-                original_cols = {col.strip(): col for col in df.columns}
-                df.rename(columns={v: k for k, v in original_cols.items()}, inplace=True)
-                lower_case_map = {col.lower(): col for col in df.columns}
-                column_mapping = {
-                    'Row Name': ['row name', 'code'],
-                    'Clip Start': ['clip start', 'start'],
-                    'Clip End': ['clip end', 'stop', 'end'],
-                    'EQUIPO': ['equipo'],
-                    'JUGADOR': ['jugador', 'player'],
-                    'RESULTADO': ['resultado', 'result'],
-                    'FORM': ['form', 'formacion']
-                }
-                rename_final = {}
-                for standard_name, possible_names in column_mapping.items():
-                    for name in possible_names:
-                        if name in lower_case_map:
-                            rename_final[lower_case_map[name]] = standard_name
-                            break
-                df.rename(columns=rename_final, inplace=True)
-
-                # --- Procesamiento de datos ---
-                if 'EQUIPO' not in df.columns:
-                    df['EQUIPO'] = 'N/A'
-                df['EQUIPO'].fillna('N/A', inplace=True)
-
-                df["Clip Start"] = pd.to_numeric(df["Clip Start"], errors='coerce')
-                df["Clip End"] = pd.to_numeric(df["Clip End"], errors='coerce')
-                df.dropna(subset=["Clip Start", "Clip End"], inplace=True)
-                df["duracion"] = (df["Clip End"] - df["Clip Start"]).round(0)
-
-                if "URL" in df.columns and df["URL"].notna().any():
-                    df["video_id"] = df["URL"].str.strip().apply(extraer_video_id)
-                    st.success("✅ Se usaron URLs individuales del CSV.")
-                else:
-                    video_id = extraer_video_id(st.session_state.youtube_url)
-                    df["video_id"] = video_id
-                    st.success("✅ Se usó la URL general de YouTube.")
-
-                st.session_state.df_original = df
-                st.session_state.new_file_loaded = True
-                st.session_state.dynamic_filters = {} # Reinicia los filtros para el nuevo archivo
-                st.success("✅ CSV cargado.")
+                # Solo se parsea si cambió el contenido: en los reruns se reutiliza el DataFrame
+                # (con las ediciones hechas en la tabla) y se conservan los filtros.
+                file_hash = uploaded_file_hash(uploaded_file)
+                default_video_id = extraer_video_id(st.session_state.youtube_url)
+                if st.session_state.get("csv_hash") != file_hash:
+                    _, df = load_clips_csv(uploaded_file.getvalue(), default_video_id, file_hash=file_hash)
+                    df = add_video_titles(df) # Un pedido por video distinto, en paralelo y con caché en disco
+                    if uses_csv_urls(df):
+                        st.success("✅ Se usaron URLs individuales del CSV.")
+                    else:
+                        st.success("✅ Se usó la URL general de YouTube.")
+
+                    activar_dataset(df, file_hash)
+                    st.session_state.video_id_general = default_video_id
+                    st.success("✅ CSV cargado.")
+                elif (
+                    not uses_csv_urls(st.session_state.df_original)
+                    and st.session_state.get("video_id_general") != default_video_id
+                ):
+                    # Cambió la URL general: se actualiza el video sin volver a cargar el archivo.
+                    df_original = st.session_state.df_original
+                    df_original["video_id"] = pd.Series(default_video_id, index=df_original.index, dtype="category")
+                    titulo = fetch_titles([default_video_id]).get(default_video_id)
+                    df_original[TITLE_COLUMN] = pd.Series(titulo, index=df_original.index, dtype="category")
+                    get_filter_engine(st.session_state.df_original).invalidate(["video_id", TITLE_COLUMN])
+                    get_aggregate_cube(st.session_state.df_original).invalidate(["video_id", TITLE_COLUMN])
+                    st.session_state.video_id_general = default_video_id
+                    guardar_dataset_activo()
 
             except Exception as e:
                 st.error(f"❌ Error al procesar el CSV: {e}")
                 return
 
-        if st.session_state.df_original is None:
+        render_dataset_store(uploaded_file)
+        render_almacen(uploaded_file)
+
+        if st.session_state.df_original is None and not st.session_state.almacen_partidos:
             return
 
         # --- Filtros Dinámicos ---
         st.header("📊 Filtros Dinámicos")
-        df = st.session_state.df_original
-        
         if 'dynamic_filters' not in st.session_state:
             st.session_state.dynamic_filters = {}
 
-        with st.expander("Aplicar filtros por columna", expanded=True):
-            for col in sorted(df.columns):
-                # Omitir columnas no filtrables
-                if col in ['video_id', 'URL', 'Clip End']: 
-                    continue
-
-                # Filtro para columnas categóricas (texto con pocas opciones)
-                if df[col].dtype == 'object' and df[col].nunique() > 1 and df[col].nunique() < 50:
-                    options = df[col].dropna().unique().tolist()
-                    try:
-                        options.sort()
-                    except TypeError:
-                        pass 
-                    
-                    default = st.session_state.dynamic_filters.get(col, options)
-                    st.session_state.dynamic_filters[col] = st.multiselect(f"Filtrar {col}", options, default=default)
-                
-                # Filtro para columnas numéricas
-                elif pd.api.types.is_numeric_dtype(df[col].dtype) and df[col].nunique() > 1:
-                    min_val, max_val = float(df[col].min()), float(df[col].max())
-                    default = st.session_state.dynamic_filters.get(col, (min_val, max_val))
-                    st.session_state.dynamic_filters[col] = st.slider(f"Rango {col}", min_val, max_val, value=default)
-
-        # Aplicar filtros guardados en el estado
-        df_filtrado = df.copy()
-        for col, value in st.session_state.get('dynamic_filters', {}).items():
-            if col not in df_filtrado.columns: continue
-            
-            if isinstance(value, list): # Filtro de Multiselect
-                df_filtrado = df_filtrado[df_filtrado[col].isin(value)]
-            elif isinstance(value, tuple): # Filtro de Slider
-                df_filtrado = df_filtrado[df_filtrado[col].between(value[0], value[1])]
-        
-        st.session_state.df_filtrado = df_filtrado
+        if st.session_state.almacen_partidos:
+            render_filtros_almacen()
+        else:
+            render_filtros_locales()
 
         st.divider()
         st.header("👁️ Columnas Visibles")
+        df = st.session_state.df_original
         all_columns = df.columns.tolist()
 
         if st.session_state.get('new_file_loaded', False):
@@ -171,14 +195,132 @@ def render_sidebar():
         st.session_state.columnas_visibles = st.multiselect(
             "Selecciona columnas a mostrar",
             options=all_columns,
-            default=st.session_state.get('columnas_visibles', all_columns)
+            default=[col for col in st.session_state.get('columnas_visibles', all_columns) if col in all_columns]
         )
 
+        if is_admin(getattr(st.user, "email", None)):
+            with st.expander("🧠 Memoria de la sesión"):
+                reporte = session_memory_report(st.session_state)
+                st.dataframe(reporte[["objeto", "MB"]], hide_index=True)
+                st.caption(f"Total: {reporte['MB'].sum():.2f} MB")
+
+def render_filtros_locales():
+    """Filtros sobre el DataFrame en memoria, resueltos con los índices de FilterEngine."""
+    df = st.session_state.df_original
+    engine = get_filter_engine(df) # Índices construidos una vez por archivo cargado
+
+    with st.expander("Aplicar filtros por columna", expanded=True):
+        for col in sorted(df.columns):
+            # Omitir columnas no filtrables
+            if col in ['video_id', 'URL', 'Clip End']: 
+                continue
+
+            # Filtro para columnas categóricas (texto con pocas opciones)
+            if engine.is_categorical(col):
+                options = engine.options(col)
+                default = st.session_state.dynamic_filters.get(col, options)
+                st.session_state.dynamic_filters[col] = st.multiselect(f"Filtrar {col}", options, default=default)
+            
+            # Filtro para columnas numéricas
+            elif engine.is_numeric(col):
+                min_val, max_val = engine.value_range(col)
+                default = st.session_state.dynamic_filters.get(col, (min_val, max_val))
+                st.session_state.dynamic_filters[col] = st.slider(f"Rango {col}", min_val, max_val, value=default)
+
+    # Aplicar filtros guardados en el estado (listas = multiselect, tuplas = slider)
+    st.session_state.filtro_posiciones = engine.positions(st.session_state.get('dynamic_filters', {}))
+
+def render_filtros_almacen():
+    """
+    Los mismos filtros, armados con las estadísticas del almacén y resueltos como WHERE en
+    SQLite: solo pasan a pandas los clips filtrados de los partidos elegidos.
+    """
+    warehouse = get_clip_warehouse(usuario_actual())
+    partidos = st.session_state.almacen_partidos
+    filtros = st.session_state.dynamic_filters
+
+    with st.expander("Aplicar filtros por columna", expanded=True):
+        for col in sorted(warehouse.columns()):
+            if col in ['video_id', 'URL', 'Clip End']:
+                continue
+            perfil = warehouse.profile(partidos, col)
+            if perfil is None:
+                continue
+            tipo, valores = perfil
+            if tipo == "categorical":
+                default = [value for value in filtros.get(col, valores) if value in valores]
+                filtros[col] = st.multiselect(f"Filtrar {col}", valores, default=default)
+            else:
+                min_val, max_val = valores
+                default = filtros.get(col, (min_val, max_val))
+                filtros[col] = st.slider(f"Rango {col}", min_val, max_val, value=default)
+
+    # Solo se vuelve a consultar cuando cambian los partidos o los filtros
+    consulta = (tuple(partidos), FilterEngine.state_key(filtros))
+    if st.session_state.df_original is None or st.session_state.get("almacen_consulta") != consulta:
+        st.session_state.df_original = warehouse.query(partidos, filtros)
+        st.session_state.almacen_consulta = consulta
+    st.session_state.filtro_posiciones = get_filter_engine(st.session_state.df_original).positions({})
+
+def render_almacen(uploaded_file):
+    """Almacén de partidos del usuario: agregar el dataset actual y consultar varios juntos."""
+    email = usuario_actual()
+    if not email:
+        return
+    st.divider()
+    st.subheader("🗄️ Temporada")
+    warehouse = get_clip_warehouse(email)
+
+    if st.session_state.df_original is not None and not st.session_state.almacen_partidos:
+        sugerido = st.session_state.dataset_activo or default_dataset_name(getattr(uploaded_file, "name", None))
+        nombre = st.text_input("Partido", value=sugerido, key="almacen_nombre")
+        fecha = st.date_input("Fecha del partido", value=None, key="almacen_fecha")
+        if st.button("Agregar al almacén", use_container_width=True) and nombre.strip():
+            try:
+                warehouse.add_match(st.session_state.df_original, nombre.strip(), fecha, csv_hash=st.session_state.get("csv_hash"))
+                st.success(f"✅ Partido '{nombre.strip()}' agregado al almacén.")
+            except Exception as e:
+                st.error(f"❌ Error al agregar el partido: {e}")
+
+    partidos = warehouse.matches()
+    if partidos.empty:
+        st.caption("Todavía no hay partidos en el almacén.")
+        return
+    etiquetas = {
+        f"{partido.name} · {partido.match_date or 'sin fecha'} · {partido.rows} clips": partido.match_id
+        for partido in partidos.itertuples(index=False)
+    }
+    activos = st.session_state.almacen_partidos or []
+    elegidos = st.multiselect(
+        "Partidos", list(etiquetas), default=[label for label, match_id in etiquetas.items() if match_id in activos]
+    )
+    col_consultar, col_quitar = st.columns(2)
+    if col_consultar.button("Consultar", use_container_width=True) and elegidos:
+        # La consulta se hace al armar los filtros (render_filtros_almacen)
+        activar_dataset(None, None)
+        st.session_state.almacen_partidos = [etiquetas[label] for label in elegidos]
+        st.session_state.almacen_consulta = None
+        st.session_state.uploader_version += 1 # Vacía el uploader para que no pise la consulta
+        st.rerun()
+    if col_quitar.button("Quitar", use_container_width=True) and elegidos:
+        for label in elegidos:
+            warehouse.delete_match(etiquetas[label])
+        if st.session_state.almacen_partidos:
+            activar_dataset(None, None)
+        st.rerun()
+
+def obtener_clips_seleccionados() -> pd.DataFrame:
+    """Filas completas de los clips seleccionados en la tabla (se guardan solo sus índices)."""
+    df = st.session_state.df_original
+    if df is None:
+        return pd.DataFrame()
+    seleccion = pd.Index(st.session_state.get("clips_seleccionados_idx", []))
+    return df.loc[seleccion[seleccion.isin(df.index)]]
+
 def render_aggrid(height=400):
     """Muestra la tabla de clips interactiva y maneja la selección y edición."""
-    df_display = st.session_state.df_filtrado.copy()
-
-    if df_display.empty:
+    posiciones = st.session_state.get("filtro_posiciones")
+    if posiciones is None or len(posiciones) == 0:
         st.info("No hay clips para mostrar con los filtros actuales.")
         return
 
@@ -187,102 +329,80 @@ def render_aggrid(height=400):
         st.warning("👈 Selecciona al menos una columna para mostrar.")
         return
 
-    df_display_final = df_display[columnas_visibles]
-    
-    gb = GridOptionsBuilder.from_dataframe(df_display_final)
-    gb.configure_selection("multiple", use_checkbox=True, header_checkbox=True)
-    
-    # Permitir edición en todas las columnas visibles
-    for col in columnas_visibles:
-        gb.configure_column(col, editable=True)
-
-    grid_options = gb.build()
-    grid_response = AgGrid(
-        df_display_final, 
-        gridOptions=grid_options, 
-        update_mode=GridUpdateMode.MODEL_CHANGED, 
-        theme="streamlit", 
+    # Solo viaja al navegador la página actual; el orden y los filtros se resuelven en pandas.
+    df = st.session_state.df_original
+    filters = filtros_locales()
+    sort_column, ascending, start, stop, page_key = render_page_controls(
+        columnas_visibles, len(posiciones), "grid_data_base", FilterEngine.state_key(filters)
+    )
+    page_positions = get_filter_engine(df).sorted_positions(filters, sort_column, ascending)[start:stop]
+    grid_response, df_display_final = render_paged_grid(
+        df,
+        page_positions,
+        columnas_visibles,
+        key=f"aggrid_data_base_{page_key}",
+        selection_key="clips_seleccionados_idx",
+        editable_columns=columnas_visibles, # Permitir edición en todas las columnas visibles
         height=height,
-        key="aggrid_data_base",
-        reload_data=False
     )
-    
-    st.session_state.clips_seleccionados = pd.DataFrame(grid_response.get("selected_rows", []))
-    
-    if grid_response['data'] is not None:
-        df_updated_view = pd.DataFrame(grid_response['data'])
-        if len(df_updated_view) == len(df_display_final):
-            df_updated_view.index = df_display_final.index
-            st.session_state.df_original.update(df_updated_view)
-            st.session_state.df_filtrado.update(df_updated_view)
-
-
-def render_player_frame(clip_info: pd.Series, autoplay: bool = True):
-    """Muestra el reproductor de video de YouTube para un clip específico."""
-    video_id = clip_info.get("video_id")
-    if not video_id:
-        st.warning("No se pudo encontrar el ID del video para este clip.")
-        return
-    start_time = int(clip_info["Clip Start"])
-    autoplay_param = "1" if autoplay else "0"
-    embed_url = f"https://www.youtube.com/embed/{video_id}?start={start_time}&autoplay={autoplay_param}&rel=0"
-    
-    # Aumentamos la altura del reproductor para aprovechar mejor la pantalla
-    player_height = 650 # Originalmente 450
-    component_height = player_height + 20 # Espacio adicional para el componente
 
-    st.components.v1.html(
-        f'<div class="video-container"><iframe src="{embed_url}" width="100%" height="{player_height}" frameborder="0" allow="autoplay; encrypted-media" allowfullscreen></iframe></div>',
-        height=component_height
-    )
+    # Solo se escriben las celdas editadas; en los demás reruns no se toca ningún DataFrame.
+    edits = extract_cell_edits(grid_response, df_display_final, columnas_visibles, "aggrid_data_base")
+    if edits:
+        apply_cell_edits(edits, st.session_state.df_original)
+        columnas_editadas = {edit.column for edit in edits}
+        get_filter_engine(st.session_state.df_original).invalidate(columnas_editadas)
+        get_aggregate_cube(st.session_state.df_original).invalidate(columnas_editadas)
+        if st.session_state.almacen_partidos:
+            get_clip_warehouse(usuario_actual()).update_cells(edits)
+        else:
+            guardar_dataset_activo() # Las ediciones de un dataset guardado persisten
+
 
 # --- SECCIÓN DE GRÁFICOS DINÁMICOS ---
 
-def render_event_frequency_chart(df):
-    if 'Row Name' in df.columns and 'EQUIPO' in df.columns:
+def render_event_frequency_chart(cube, counts):
+    if cube.has('Row Name', 'EQUIPO'):
         st.markdown("#### Frecuencia de Eventos por Equipo")
         try:
-            chart_data = df.groupby(['EQUIPO', 'Row Name']).size().unstack(fill_value=0)
+            chart_data = cube.pivot(counts, 'EQUIPO', 'Row Name')
             st.bar_chart(chart_data)
             st.caption("Muestra el número de veces que ocurre cada evento, agrupado por equipo.")
         except Exception as e:
             st.warning(f"No se pudo generar el gráfico de frecuencia: {e}")
         st.divider()
 
-def render_result_distribution_chart(df):
-    if 'RESULTADO' in df.columns and 'EQUIPO' in df.columns:
+def render_result_distribution_chart(cube, counts):
+    if cube.has('RESULTADO', 'EQUIPO'):
         st.markdown("#### Distribución de Resultados por Equipo")
-        df_chart = df.dropna(subset=['RESULTADO'])
-        if not df_chart.empty:
-            try:
-                chart_data = df_chart.groupby(['EQUIPO', 'RESULTADO']).size().unstack(fill_value=0)
+        try:
+            chart_data = cube.pivot(counts, 'EQUIPO', 'RESULTADO')
+            if not chart_data.empty:
                 st.bar_chart(chart_data)
                 st.caption("Muestra la cantidad de resultados (ej: GANO, PERDIO) para cada equipo.")
-            except Exception as e:
-                st.warning(f"No se pudo generar el gráfico de resultados: {e}")
-        else:
-            st.info("No hay datos en la columna 'RESULTADO' para graficar.")
+            else:
+                st.info("No hay datos en la columna 'RESULTADO' para graficar.")
+        except Exception as e:
+            st.warning(f"No se pudo generar el gráfico de resultados: {e}")
         st.divider()
 
-def render_lineout_charts(df):
-    if 'Row Name' in df.columns and df['Row Name'].str.contains('LINEOUT', case=False, na=False).any():
-        lineout_df = df[df['Row Name'].str.contains('LINEOUT', case=False, na=False)].copy()
+def render_lineout_charts(cube, counts):
+    if cube.has('Row Name') and cube.total(counts, where=['_lineout']) > 0:
         st.markdown("### Análisis de Lineouts")
 
-        if 'FORM' in lineout_df.columns:
+        if cube.has('FORM'):
             st.markdown("##### Formaciones de Lineout")
-            form_counts = lineout_df['FORM'].value_counts()
+            form_counts = cube.value_counts(counts, 'FORM', where=['_lineout'])
             if not form_counts.empty:
                 st.bar_chart(form_counts)
                 st.caption("Frecuencia de las formaciones ('FORM') en los lineouts.")
             else:
                 st.info("No hay datos en 'FORM' para los lineouts.")
 
-        if 'JUGADOR' in lineout_df.columns and 'RESULTADO' in lineout_df.columns:
+        if cube.has('JUGADOR', 'RESULTADO'):
             st.markdown("##### Jugadores con más Lineouts Ganados")
-            won_lineouts = lineout_df[lineout_df['RESULTADO'].str.contains('GANO|WIN', case=False, na=False)]
-            if not won_lineouts.empty:
-                player_wins = won_lineouts['JUGADOR'].value_counts()
+            if cube.total(counts, where=['_lineout', '_win']) > 0:
+                player_wins = cube.value_counts(counts, 'JUGADOR', where=['_lineout', '_win'])
                 if not player_wins.empty:
                     st.bar_chart(player_wins)
                     st.caption("Número de lineouts ganados por jugador.")
@@ -294,7 +414,7 @@ def render_lineout_charts(df):
 
 def render_analysis_section():
     """Muestra el expander con gráficos dinámicos y contexto."""
-    df_filtrado = st.session_state.get("df_filtrado", pd.DataFrame())
+    posiciones = st.session_state.get("filtro_posiciones")
 
     with st.expander("📊 Gráficos y Contexto del Análisis", expanded=True):
         st.subheader("📝 Añadir Contexto al Análisis")
@@ -307,13 +427,19 @@ def render_analysis_section():
         st.divider()
         st.subheader("📈 Gráficos de Análisis")
 
-        if df_filtrado.empty:
+        if posiciones is None or len(posiciones) == 0:
             st.info("Carga y filtra datos para ver los gráficos.")
             return
 
-        render_event_frequency_chart(df_filtrado)
-        render_result_distribution_chart(df_filtrado)
-        render_lineout_charts(df_filtrado)
+        # Conteos por celda del cubo para el estado de filtros actual (memoizados)
+        df = st.session_state.df_original
+        filters = filtros_locales()
+        cube = get_aggregate_cube(df)
+        counts = cube.counts(get_filter_engine(df).positions(filters), FilterEngine.state_key(filters))
+
+        render_event_frequency_chart(cube, counts)
+        render_result_distribution_chart(cube, counts)
+        render_lineout_charts(cube, counts)
 
 # --- VISTA PRINCIPAL ---
 
@@ -324,7 +450,7 @@ def render_main_view():
     
     render_aggrid()
 
-    clips_seleccionados = st.session_state.get("clips_seleccionados", pd.DataFrame())
+    clips_seleccionados = obtener_clips_seleccionados()
     is_playlist_empty = clips_seleccionados.empty
 
     # --- Lógica de validación para el índice de la playlist ---
@@ -340,39 +466,25 @@ def render_main_view():
             st.info("La selección de clips cambió. La playlist continuará desde el inicio de la nueva selección.")
 
     # --- Controles de la Playlist ---
-    cols = st.columns([1.5, 1, 1, 1, 1.5, 2])
+    cols = st.columns([1.5, 1, 4.5])
 
-    if cols[0].button("▶️ Iniciar Playlist", disabled=is_playlist_empty):
+    if cols[0].button("▶️ Iniciar Playlist", disabled=is_playlist_empty or st.session_state.playlist_active):
         st.session_state.playlist_active = True
         st.session_state.playlist_index = 0
         st.rerun()
 
-    if cols[1].button("⏪ Anterior", disabled=not st.session_state.playlist_active):
-        if st.session_state.playlist_index > 0:
-            st.session_state.playlist_index -= 1
-            st.rerun()
-
-    if cols[2].button("⏩ Próximo", disabled=not st.session_state.playlist_active):
-        if st.session_state.playlist_index < len(clips_seleccionados) - 1:
-            st.session_state.playlist_index += 1
-            st.rerun()
-
-    if cols[3].button("🛑 Detener", disabled=not st.session_state.playlist_active):
+    if cols[1].button("🛑 Detener", disabled=not st.session_state.playlist_active):
         st.session_state.playlist_active = False
         st.rerun()
 
-    if st.session_state.playlist_active and not is_playlist_empty:
-        cols[5].info(f"**Clip {st.session_state.playlist_index + 1} de {len(clips_seleccionados)}**")
-
     # --- Reproductor de Video ---
+    # La playlist avanza en el navegador (anterior/próximo, Clip End): no hay reruns por clip
     if st.session_state.playlist_active and not is_playlist_empty:
-        # El índice ya ha sido validado, por lo que esta línea ahora es segura
-        clip_to_show = clips_seleccionados.iloc[st.session_state.playlist_index]
-        
-        title_cols = [c for c in ["Row Name", "EQUIPO", "JUGADOR", "RESULTADO"] if c in clip_to_show]
-        st.markdown(f"### " + " | ".join([str(clip_to_show[c]) for c in title_cols]))
-        
-        render_player_frame(clip_to_show, autoplay=True)
+        detenido_en = playlist_player(clips_seleccionados, start_index=st.session_state.playlist_index)
+        if detenido_en is not None:
+            st.session_state.playlist_active = False
+            st.session_state.playlist_index = detenido_en
+            st.rerun()
     
     st.divider()
     render_analysis_section()
@@ -4,6 +4,8 @@ import subprocess
 import os
 import shutil
 
+from modules.yt_dlp_updater import wait_for_upgrade
+
 def run_download_playlist_page():
     st.title("Descargar Playlist de YouTube")
 
@@ -23,6 +25,8 @@ def run_download_playlist_page():
 
                 st.info(f"Los archivos se descargarán en: {download_path}")
 
+                wait_for_upgrade() # No ejecutar yt-dlp mientras se actualiza en segundo plano
+
                 # Construct the yt-dlp command
                 command = [
                     "yt-dlp",
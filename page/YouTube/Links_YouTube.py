@@ -1,26 +1,11 @@
 import streamlit as st
-import re
-import urllib.parse
-from yt_dlp import YoutubeDL
 
-def limpiar_url_youtube(url):
-    """Limpia la URL de YouTube para quitar parámetros innecesarios."""
-    parsed = urllib.parse.urlparse(url)
-    query = urllib.parse.parse_qs(parsed.query)
-    video_id = query.get("v", [None])[0]
-    if not video_id and parsed.netloc == "youtu.be":
-        video_id = parsed.path.strip("/")
-    return f"https://www.youtube.com/watch?v={video_id}" if video_id else url
+from modules.youtube_urls import limpiar_url_youtube
+from modules.yt_dlp_service import get_extraction_service
 
 def obtener_info_video(video_url):
-    """Obtiene la información y el enlace de descarga directo del video."""
-    ydl_opts = {
-        'format': 'best[ext=mp4]/best',
-        'quiet': True,
-    }
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(video_url, download=False)
-        return info
+    """Obtiene la información y el enlace de descarga directo del video (en caché mientras el enlace siga vigente)."""
+    return get_extraction_service().get_info(video_url, profile="download_link")
 
 def run_links_youtube_page():
     """Función principal de la página de Streamlit."""
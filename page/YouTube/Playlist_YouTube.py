@@ -1,32 +1,14 @@
 # Force redeploy
 import streamlit as st
 import pandas as pd
-import requests
+import numpy as np
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-from typing import Optional
-
-# --- FUNCIONES DE UTILIDAD ---
-
-def obtener_titulo_youtube(url: str) -> str:
-    """Obtiene el título de un video de YouTube a partir de su URL."""
-    try:
-        oembed_url = f"https://www.youtube.com/oembed?url={url}&format=json"
-        response = requests.get(oembed_url)
-        response.raise_for_status()
-        return response.json().get("title", "🎬 Sin título")
-    except requests.exceptions.RequestException:
-        return "⚠️ No se pudo obtener el título"
-
-def extraer_video_id(url: str) -> Optional[str]:
-    """Extrae el ID de un video de YouTube de diferentes formatos de URL."""
-    try:
-        if "watch?v=" in url:
-            return url.split("watch?v=")[1].split("&")[0]
-        if "youtu.be/" in url:
-            return url.split("youtu.be/")[1].split("?")[0]
-    except IndexError:
-        return None
-    return None
+
+from modules.clip_ingest import MissingColumnsError, assign_clip_ids, load_clips_csv, uploaded_file_hash
+from modules.grid_edits import ROW_ID_FIELD, apply_cell_edits, extract_cell_edits
+from modules.playlist_player import playlist_player
+from modules.video_titles import add_video_titles
+from modules.youtube_urls import extraer_video_id
 
 # --- GESTIÓN DE ESTADO ---
 
@@ -38,10 +20,12 @@ def inicializar_estado():
         st.session_state.df_original = None
     if "df_filtrado" not in st.session_state:
         st.session_state.df_filtrado = pd.DataFrame()
-    if "clips_seleccionados" not in st.session_state:
-        st.session_state.clips_seleccionados = pd.DataFrame()
+    if "clips_seleccionados_ids" not in st.session_state:
+        st.session_state.clips_seleccionados_ids = np.array([], dtype=np.int64) # clip_id en orden de selección
     if "playlist_index" not in st.session_state:
         st.session_state.playlist_index = 0
+    if "playlist_start_token" not in st.session_state:
+        st.session_state.playlist_start_token = 0 # Cambia con cada clic en la tabla: el reproductor salta aunque el índice se repita
     if "playlist_active" not in st.session_state:
         st.session_state.playlist_active = False
     if "active_clip_details" not in st.session_state:
@@ -51,6 +35,11 @@ def inicializar_estado():
     if "data_context" not in st.session_state:
         st.session_state.data_context = ""
 
+def usar_video_general(df: pd.DataFrame, video_id) -> pd.DataFrame:
+    """Esta página reproduce todos los clips desde la URL general de YouTube."""
+    df = df.assign(video_id=pd.Series(video_id, index=df.index, dtype="category"))
+    return add_video_titles(df)
+
 def render_sidebar():
     with st.sidebar:
         st.divider()
@@ -60,72 +49,32 @@ def render_sidebar():
         uploaded_file = st.file_uploader("📂 Cargar CSV", type=["csv"])
         if uploaded_file:
             try:
-                df = pd.read_csv(uploaded_file, sep=None, engine="python")
-                
-                # --- Lógica de mapeo de columnas flexible y insensible a mayúsculas ---
-                
-                # 1. Normalizar columnas del CSV (quitar espacios)
-                original_cols = {col.strip(): col for col in df.columns}
-                df.rename(columns={v: k for k, v in original_cols.items()}, inplace=True)
-                
-                # 2. Crear un mapa de columnas en minúsculas para la búsqueda
-                lower_case_map = {col.lower(): col for col in df.columns}
-
-                # 3. Definir los mapeos estándar -> posibles variantes (en minúsculas)
-                column_mapping = {
-                    'Row Name': ['row name', 'code'],
-                    'Clip Start': ['clip start', 'start'],
-                    'Clip End': ['clip end', 'stop', 'end'], # 'end' añadido
-                    'EQUIPO': ['equipo']
-                }
-
-                rename_final = {}
-                missing_columns = []
-
-                # 4. Encontrar las columnas y preparar el renombrado
-                for standard_name, possible_names in column_mapping.items():
-                    found = False
-                    for name in possible_names:
-                        if name in lower_case_map:
-                            original_name = lower_case_map[name]
-                            rename_final[original_name] = standard_name
-                            found = True
-                            break
-                    if not found:
-                        missing_columns.append(standard_name)
-                
-                # 5. Validar si falta alguna columna obligatoria
-                required_columns = ['Row Name', 'Clip Start', 'Clip End']
-                missing_required = [col for col in required_columns if col in missing_columns]
-
-                if missing_required:
-                    st.error(f"❌ Faltan columnas obligatorias. Asegúrate de que tu CSV contenga: {', '.join(missing_required)}")
-                    return
-
-                # 6. Aplicar el renombrado para las columnas encontradas
-                df.rename(columns=rename_final, inplace=True)
-
-                # 7. Manejar la columna opcional 'EQUIPO'
-                if 'EQUIPO' not in df.columns:
-                    df['EQUIPO'] = 'N/A' # Añadir valor por defecto
-                    st.warning("⚠️ Columna 'EQUIPO' no encontrada. Se añadió un valor por defecto ('N/A') que puedes editar en la tabla.")
-
-                # Rellenar valores nulos en EQUIPO por si el CSV los tuviera
-                df['EQUIPO'].fillna('N/A', inplace=True)
-
-                # --- Fin de la lógica de mapeo ---
-
-                df["Clip Start"] = pd.to_numeric(df["Clip Start"], errors='coerce')
-                df["Clip End"] = pd.to_numeric(df["Clip End"], errors='coerce')
-                df.dropna(subset=["Clip Start", "Clip End"], inplace=True)
-                df["duracion"] = (df["Clip End"] - df["Clip Start"]).round(0)
-
+                # Solo se parsea (y se numeran los clip_id) si cambió el archivo: en los reruns se
+                # reutiliza el DataFrame de la sesión, con las ediciones hechas en la tabla.
+                file_hash = uploaded_file_hash(uploaded_file)
                 video_id = extraer_video_id(st.session_state.youtube_url)
-                df["video_id"] = video_id
-                st.success("✅ Se usó la URL general de YouTube.")
-
-                st.session_state.df_original = df
-                st.success("✅ CSV cargado.")
+                if st.session_state.get("playlist_csv_hash") != file_hash or st.session_state.df_original is None:
+                    _, df = load_clips_csv(uploaded_file.getvalue(), video_id, file_hash=file_hash)
+                    if (df["EQUIPO"] == "N/A").all():
+                        st.warning("⚠️ Columna 'EQUIPO' no encontrada. Se añadió un valor por defecto ('N/A') que puedes editar en la tabla.")
+
+                    df = assign_clip_ids(df)
+                    df = usar_video_general(df, video_id)
+                    st.success("✅ Se usó la URL general de YouTube.")
+
+                    st.session_state.df_original = df
+                    st.session_state.playlist_csv_hash = file_hash
+                    st.session_state.clips_seleccionados_ids = np.array([], dtype=np.int64)
+                    st.session_state.playlist_index = 0
+                    st.session_state.playlist_active = False
+                    st.success("✅ CSV cargado.")
+                elif st.session_state.get("video_id_general") != video_id:
+                    # Cambió la URL general: se actualiza el video sin volver a cargar el archivo.
+                    st.session_state.df_original = usar_video_general(st.session_state.df_original, video_id)
+                st.session_state.video_id_general = video_id
+            except MissingColumnsError as e:
+                st.error(f"❌ Faltan columnas obligatorias. Asegúrate de que tu CSV contenga: {', '.join(e.columns)}")
+                return
             except Exception as e:
                 st.error(f"❌ Error al procesar el CSV: {e}")
                 return
@@ -163,9 +112,8 @@ def render_sidebar():
         if not st.session_state.get("playlist_active"):
             if "last_selected_index" not in st.session_state:
                 st.session_state["last_selected_index"] = None
-            if not st.session_state.get("clips_seleccionados", pd.DataFrame()).empty:
-                last_index = st.session_state.clips_seleccionados.index[-1]
-                st.session_state.last_selected_index = last_index
+            if len(st.session_state.clips_seleccionados_ids):
+                st.session_state.last_selected_index = st.session_state.clips_seleccionados_ids[-1]
             else:
                 st.session_state.last_selected_index = None
 
@@ -173,7 +121,7 @@ def render_sidebar():
 def render_aggrid(height=300):
     """Muestra la tabla de clips interactiva y maneja la selección y edición."""
     if st.session_state.playlist_active:
-        df_display = st.session_state.clips_seleccionados.copy()
+        df_display = obtener_clips_seleccionados()
     else:
         df_display = st.session_state.df_filtrado.copy()
 
@@ -210,7 +158,8 @@ def render_aggrid(height=300):
                 let rowIndex = e.rowIndex;
                 api.forEachNode(function(node) {
                     if (node.rowIndex === rowIndex) {
-                        let data = node.data;
+                        // click_id distingue dos clics seguidos en la misma fila
+                        let data = Object.assign({}, node.data, {click_id: Date.now()});
                         Streamlit.setComponentValue(data);
                     }
                 });
@@ -219,7 +168,9 @@ def render_aggrid(height=300):
 ))
     else:
         # Configurar edición y selección para la tabla principal
-        gb.configure_selection("multiple", use_checkbox=True, header_checkbox=True, pre_selected_rows=st.session_state.clips_seleccionados.index.tolist())
+        # AgGrid identifica las filas por su posición en la tabla mostrada
+        pre_selected = [str(i) for i in np.flatnonzero(df_display_final.index.isin(st.session_state.clips_seleccionados_ids))]
+        gb.configure_selection("multiple", use_checkbox=True, header_checkbox=True, pre_selected_rows=pre_selected)
         for col in editable_cols:
             if col in df_display_final.columns:
                  gb.configure_column(col, editable=True)
@@ -238,65 +189,50 @@ def render_aggrid(height=300):
     )
 
     if st.session_state.playlist_active:
-        if grid_response.get("component_value"):
-            selected_row_data = grid_response["component_value"]
-            clips_df = st.session_state.clips_seleccionados
-            if not clips_df.empty:
-                # Para encontrar el índice correcto, usamos las columnas visibles que definen unívocamente la fila
-                key_cols = [c for c in ["Row Name", "EQUIPO", "Clip Start"] if c in clips_df.columns]
-                
-                match_conditions = True
-                for col in key_cols:
-                    if col == "Clip Start":
-                        match_conditions &= (clips_df[col].round(0) == selected_row_data[col])
-                    else:
-                        match_conditions &= (clips_df[col] == selected_row_data[col])
-
-                match_index = clips_df[match_conditions].index
-                
-                if not match_index.empty:
-                    st.session_state.playlist_index = match_index[0]
-                    st.rerun()
+        selected_row_data = grid_response.get("component_value")
+        click_id = selected_row_data.get("click_id") if isinstance(selected_row_data, dict) else None
+        # El grid devuelve el último clic en todos los reruns: cada click_id se procesa una sola vez
+        if click_id is not None and ROW_ID_FIELD in selected_row_data and click_id != st.session_state.get("playlist_last_click"):
+            st.session_state.playlist_last_click = click_id
+            # La tabla de la playlist tiene los clips en orden: la posición de la fila es el índice
+            clicked_index = int(selected_row_data[ROW_ID_FIELD])
+            if clicked_index < len(df_display_final):
+                # No se compara con playlist_index: el navegador pudo avanzar desde el último salto
+                st.session_state.playlist_index = clicked_index
+                st.session_state.playlist_start_token += 1
+                st.rerun()
     else:
-        # Este bloque maneja la tabla principal (no la playlist)
-        st.session_state.clips_seleccionados = pd.DataFrame(grid_response.get("selected_rows", []))
-        
-        if grid_response['data'] is not None:
-            df_updated_view = pd.DataFrame(grid_response['data'])
-            if len(df_updated_view) == len(df_display_final):
-                df_updated_view.index = df_display_final.index
-                st.session_state.df_original.update(df_updated_view)
-                st.session_state.df_filtrado.update(df_updated_view)
-
-def render_player_frame(clip_info: pd.Series, autoplay: bool = True):
-    """Muestra el reproductor de video de YouTube para un clip específico."""
-    video_id = clip_info["video_id"]
-    start_time = int(clip_info["Clip Start"])
-    autoplay_param = "1" if autoplay else "0"
-    embed_url = f"https://www.youtube.com/embed/{video_id}?start={start_time}&autoplay={autoplay_param}&rel=0"
-    
-    st.components.v1.html(
-        f'<div class="video-container"><iframe src="{embed_url}" width="100%" height="450" frameborder="0" allow="autoplay; encrypted-media" allowfullscreen></iframe></div>',
-        height=480
-    )
-
-def get_full_clip_details(clip_row: pd.Series) -> Optional[pd.Series]:
-    """Busca los detalles completos de un clip en el DataFrame original."""
+        # Este bloque maneja la tabla principal (no la playlist): se guardan solo los clip_id
+        nodes = grid_response.grid_response.get("nodes") if isinstance(grid_response.grid_response, dict) else None
+        if nodes is not None and len(nodes) == len(df_display_final): # La respuesta corresponde a esta tabla
+            seleccion = grid_response.selected_rows
+            if seleccion is None:
+                st.session_state.clips_seleccionados_ids = np.array([], dtype=np.int64)
+            else:
+                actuales = df_display_final.index[seleccion.index.astype(int)].to_numpy()
+                # AgGrid devuelve la selección en el orden de la tabla: se conservan los clips ya
+                # elegidos en su orden y los nuevos se agregan al final.
+                previos = st.session_state.clips_seleccionados_ids
+                st.session_state.clips_seleccionados_ids = np.concatenate([
+                    previos[np.isin(previos, actuales)],
+                    actuales[~np.isin(actuales, previos)],
+                ])
+
+        # Solo se escriben las celdas editadas; en los demás reruns no se toca ningún DataFrame.
+        edits = extract_cell_edits(grid_response, df_display_final, editable_cols, "aggrid_clips")
+        if edits:
+            # Solo df_original: df_filtrado es una vista que se vuelve a armar desde él; en este
+            # rerun se vuelve a tomar su subconjunto para que el gráfico vea las ediciones.
+            apply_cell_edits(edits, st.session_state.df_original)
+            st.session_state.df_filtrado = st.session_state.df_original.loc[st.session_state.df_filtrado.index]
+
+def obtener_clips_seleccionados() -> pd.DataFrame:
+    """Filas completas de los clips seleccionados, en orden de selección (búsqueda por clip_id)."""
     df_original = st.session_state.df_original
-    if df_original is None or clip_row.empty: return None
-    
-    # Usa un conjunto de claves para encontrar la fila, ya que las columnas pueden variar
-    key_cols = [c for c in ["Row Name", "EQUIPO", "Clip Start"] if c in df_original.columns and c in clip_row.index]
-    
-    match_conditions = True
-    for col in key_cols:
-        if col == "Clip Start":
-            match_conditions &= (df_original[col].round(0) == round(clip_row[col], 0))
-        else:
-            match_conditions &= (df_original[col] == clip_row[col])
-
-    fila_completa = df_original[match_conditions]
-    return fila_completa.iloc[0] if not fila_completa.empty else None
+    if df_original is None:
+        return pd.DataFrame()
+    ids = pd.Index(st.session_state.clips_seleccionados_ids)
+    return df_original.loc[ids[ids.isin(df_original.index)]]
 
 def render_analysis_section():
     """Muestra el expander con el gráfico y el área de texto para el contexto."""
@@ -344,36 +280,35 @@ def render_main_view():
     with st.expander("📁 Lista de Clips", expanded=expander_expanded):
         render_aggrid()
 
-    clip_to_show = None
-    autoplay = False
-    clips_seleccionados = st.session_state.clips_seleccionados
+    clips_seleccionados = obtener_clips_seleccionados()
+
+    if st.session_state.playlist_active and clips_seleccionados.empty:
+        st.success("✅ Playlist finalizada o vacía.")
+        st.session_state.playlist_active = False
+        st.session_state.show_expander = True
 
     if st.session_state.playlist_active:
-        if not clips_seleccionados.empty and st.session_state.playlist_index < len(clips_seleccionados):
-            clip_info = clips_seleccionados.iloc[st.session_state.playlist_index]
-            clip_to_show = get_full_clip_details(clip_info)
-            autoplay = True
-        else:
-            st.success("✅ Playlist finalizada o vacía.")
+        # La playlist avanza en el navegador (anterior/próximo, Clip End): no hay reruns por clip
+        detenido_en = playlist_player(
+            clips_seleccionados,
+            start_index=st.session_state.playlist_index,
+            start_token=st.session_state.playlist_start_token,
+            height=450,
+        )
+        if detenido_en is not None:
             st.session_state.playlist_active = False
+            st.session_state.playlist_index = detenido_en
             st.session_state.show_expander = True
-
-    if clip_to_show is not None:
-        resultado_str = f" | {clip_to_show['RESULTADO']}" if 'RESULTADO' in clip_to_show and pd.notna(clip_to_show['RESULTADO']) else ""
-        st.markdown(f"### **{clip_to_show['Row Name']}** | {clip_to_show['EQUIPO']}{resultado_str}")
-        render_player_frame(clip_to_show, autoplay=autoplay)
+            st.rerun()
     else:
         st.info("Selecciona uno o más clips de la tabla para comenzar.")
 
     st.divider()
 
-    clips = st.session_state.clips_seleccionados
+    clips = clips_seleccionados
     is_playlist_empty = clips.empty
 
-    is_first_clip = st.session_state.playlist_index == 0
-    is_last_clip = st.session_state.playlist_index >= len(clips) - 1
-
-    cols = st.columns([1.5, 1, 1, 1, 1.5, 2])
+    cols = st.columns([1.5, 1, 1.5, 3])
 
     if cols[0].button("▶️ Iniciar Playlist", disabled=is_playlist_empty or st.session_state.playlist_active):
         st.session_state.playlist_active = True
@@ -381,28 +316,17 @@ def render_main_view():
         st.session_state.show_expander = False
         st.rerun()
 
-    if cols[1].button("⏪ Anterior", disabled=not st.session_state.playlist_active or is_first_clip):
-        st.session_state.playlist_index -= 1
-        st.rerun()
-
-    if cols[2].button("⏩ Próximo", disabled=not st.session_state.playlist_active or is_last_clip):
-        st.session_state.playlist_index += 1
-        st.rerun()
-
-    if cols[3].button("🛑 Detener", disabled=not st.session_state.playlist_active):
+    if cols[1].button("🛑 Detener", disabled=not st.session_state.playlist_active):
         st.session_state.playlist_active = False
         st.session_state.show_expander = True
         st.rerun()
 
     csv_data = b""
     if not is_playlist_empty:
-        full_details_list = [get_full_clip_details(row) for _, row in clips.iterrows()]
-        full_details_list = [row for row in full_details_list if row is not None]
-        if full_details_list:
-            df_to_download = pd.DataFrame(full_details_list)
-            csv_data = df_to_download.to_csv(index=False).encode('utf-8-sig')
+        # Las filas completas ya salen del índice por clip_id: un solo to_csv
+        csv_data = clips.to_csv(index=False).encode('utf-8-sig')
 
-    cols[4].download_button(
+    cols[2].download_button(
         label="📥 Descargar CSV",
         data=csv_data,
         file_name="playlist_seleccionada.csv",
@@ -411,9 +335,6 @@ def render_main_view():
         help="Descarga los clips seleccionados en formato CSV."
     )
 
-    if st.session_state.playlist_active and not is_playlist_empty:
-        cols[5].info(f"**Clip {st.session_state.playlist_index + 1} de {len(clips)}**")
-
     st.divider()
     
     render_analysis_section()
@@ -0,0 +1,268 @@
+"""
+Benchmark del webhook de Mercado Pago, ejecutable sin red:
+
+    cd webhook
+    pip install -r requirements-dev.txt   # mongomock, solo para pruebas locales
+    python benchmark.py --notifications 2000 --unique 500 --concurrency 16 --mp-latency-ms 80 --mp-error-rate 0.02
+
+Levanta la app FastAPI real con uvicorn, un doble local de la API de pagos de MP (latencia y
+tasa de errores configurables, en otro proceso), generadores de carga en procesos aparte y mongomock (o un Mongo local con --mongo-uri). Envía ráfagas
+de POST /webhook/mercadopago y reporta en JSON la latencia del ACK (p50/p95/p99), el lag
+hasta la activación en Mongo y la cantidad de llamadas a la API de MP.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 2) if values else None,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+def run_fake_mp_api(port, latency_ms, jitter_ms, error_rate, approved_rate, calls, errors):
+    """
+    Doble de GET /v1/payments/{id} con latencia, errores 500 y conteo de llamadas.
+    Corre en su propio proceso para no competir por el GIL con la app medida.
+    """
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+
+    api = FastAPI()
+    rng = random.Random(42)
+
+    @api.get("/v1/payments/{payment_id}")
+    async def get_payment(payment_id: str):
+        with calls.get_lock():
+            calls.value += 1
+        await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+        if rng.random() < error_rate:
+            with errors.get_lock():
+                errors.value += 1
+            return JSONResponse({"message": "internal_error"}, status_code=500)
+        # El estado depende solo del ID, así los reintentos ven siempre lo mismo.
+        approved = random.Random(payment_id).random() < approved_rate
+        return {
+            "id": payment_id,
+            "status": "approved" if approved else "rejected",
+            "payer": {"email": f"user{payment_id}@bench.local"},
+        }
+
+    uvicorn.run(api, host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_for_port(port, timeout_s=15.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"El puerto {port} no respondió en {timeout_s}s")
+
+
+async def _send_burst(url, payment_ids, concurrency):
+    import httpx
+
+    latencies_ms = []
+    first_ack = {}
+    status_codes = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        async def post(payment_id):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(url, json={"type": "payment", "data": {"id": payment_id}})
+                elapsed = time.perf_counter() - started
+            latencies_ms.append(elapsed * 1000)
+            status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+            first_ack.setdefault(payment_id, time.time()) # Reloj de pared: se compara entre procesos
+
+        await asyncio.gather(*(post(pid) for pid in payment_ids))
+    return latencies_ms, first_ack, status_codes
+
+
+def send_burst(url, payment_ids, concurrency):
+    """Generador de carga; se ejecuta en procesos aparte (ver --drivers)."""
+    return asyncio.run(_send_burst(url, payment_ids, concurrency))
+
+
+def wait_for_activations(collection, expected_emails, first_ack, timeout_s):
+    """Consulta Mongo hasta ver activados todos los emails esperados; devuelve el lag por pago."""
+    lags_ms = []
+    pending = set(expected_emails)
+    deadline = time.perf_counter() + timeout_s
+    while pending and time.perf_counter() < deadline:
+        now = time.time()
+        for doc in collection.find({"user_email": {"$in": list(pending)}, "status": "active"}, {"user_email": 1}):
+            email = doc["user_email"]
+            payment_id = expected_emails[email]
+            lags_ms.append((now - first_ack[payment_id]) * 1000)
+            pending.discard(email)
+        if pending:
+            time.sleep(0.02)
+    return lags_ms, len(pending)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline del webhook de Mercado Pago.")
+    parser.add_argument("--notifications", type=int, default=1000, help="Total de POST a enviar")
+    parser.add_argument("--unique", type=int, default=250, help="Pagos distintos (el resto son duplicados)")
+    parser.add_argument("--concurrency", type=int, default=16, help="POST simultáneos (total entre drivers)")
+    parser.add_argument("--drivers", type=int, default=4, help="Procesos generadores de carga")
+    parser.add_argument("--mp-latency-ms", type=float, default=80.0)
+    parser.add_argument("--mp-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--mp-error-rate", type=float, default=0.0)
+    parser.add_argument("--approved-rate", type=float, default=0.9)
+    parser.add_argument("--mongo-uri", default=None, help="Mongo real (por defecto mongomock)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Espera máxima de activaciones (s)")
+    parser.add_argument("--output", default=None, help="Archivo donde guardar el JSON de resultados")
+    args = parser.parse_args(argv)
+
+    ctx = multiprocessing.get_context("spawn")
+    mp_calls, mp_errors = ctx.Value("i", 0), ctx.Value("i", 0)
+    mp_port, app_port = free_port(), free_port()
+    workdir = tempfile.mkdtemp(prefix="webhook-bench-")
+
+    # La configuración de main.py se lee al importarlo: se prepara el entorno antes.
+    os.environ.update({
+        "MONGO_URI": args.mongo_uri or "mongodb://bench.invalid",
+        "MERCADOPAGO_ACCESS_TOKEN": "bench-token",
+        "MERCADOPAGO_API_URL": f"http://127.0.0.1:{mp_port}",
+        "JOB_QUEUE_PATH": os.path.join(workdir, "payment_jobs.sqlite3"),
+        "JOB_MAX_ATTEMPTS": os.environ.get("JOB_MAX_ATTEMPTS", "8"),
+    })
+    if not args.mongo_uri:
+        try:
+            import mongomock
+        except ImportError:
+            print("Falta mongomock: instálalo con `pip install -r requirements-dev.txt` o usa --mongo-uri.", file=sys.stderr)
+            return 2
+        import pymongo
+
+        pymongo.MongoClient = mongomock.MongoClient
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import logging
+    logging.disable(logging.INFO) # Sin logs por pago: se mide el pipeline, no la consola
+    import main as webhook_main
+    # Reintentos rápidos para que los errores simulados no dominen la medición.
+    webhook_main.job_queue.base_backoff = float(os.environ.get("BENCH_BASE_BACKOFF", "0.2"))
+
+    mp_process = ctx.Process(
+        target=run_fake_mp_api,
+        args=(mp_port, args.mp_latency_ms, args.mp_jitter_ms, args.mp_error_rate, args.approved_rate,
+              mp_calls, mp_errors),
+        daemon=True,
+    )
+    mp_process.start()
+    wait_for_port(mp_port)
+    app_server, app_thread = start_server(webhook_main.app, app_port)
+
+    unique_ids = [str(1_000_000 + i) for i in range(args.unique)]
+    payment_ids = [unique_ids[i % len(unique_ids)] for i in range(args.notifications)]
+    random.Random(7).shuffle(payment_ids)
+
+    url = f"http://127.0.0.1:{app_port}/webhook/mercadopago"
+    chunks = [payment_ids[i::args.drivers] for i in range(args.drivers)]
+    per_driver = max(1, args.concurrency // args.drivers)
+    ack_ms, first_ack, status_codes = [], {}, {}
+    with ProcessPoolExecutor(max_workers=args.drivers, mp_context=ctx) as drivers:
+        drivers.submit(time.sleep, 0).result() # Arranca los procesos antes de medir
+        started = time.perf_counter()
+        for latencies, acks, codes in drivers.map(send_burst, [url] * args.drivers, chunks, [per_driver] * args.drivers):
+            ack_ms.extend(latencies)
+            for payment_id, acked_at in acks.items():
+                first_ack[payment_id] = min(acked_at, first_ack.get(payment_id, acked_at))
+            for code, count in codes.items():
+                status_codes[code] = status_codes.get(code, 0) + count
+        burst_s = time.perf_counter() - started
+
+    expected = {
+        f"user{pid}@bench.local": pid for pid in unique_ids
+        if random.Random(pid).random() < args.approved_rate
+    }
+    lag_ms, missing = wait_for_activations(
+        webhook_main.suscripciones_collection, expected, first_ack, args.timeout
+    )
+    total_s = time.perf_counter() - started
+    queue_stats = webhook_main.job_queue.stats()
+
+    app_server.should_exit = True
+    app_thread.join(timeout=30)
+    mp_process.terminate()
+
+    results = {
+        "params": vars(args),
+        "notifications": args.notifications,
+        "unique_payments": args.unique,
+        "burst_seconds": round(burst_s, 3),
+        "ack_throughput_per_s": round(args.notifications / burst_s, 1) if burst_s else None,
+        "ack_latency_ms": summarize(ack_ms),
+        "ack_status_codes": status_codes,
+        "activation_lag_ms": summarize(lag_ms),
+        "expected_activations": len(expected),
+        "missing_activations": missing,
+        "total_seconds": round(total_s, 3),
+        "mp_api_calls": mp_calls.value,
+        "mp_api_errors": mp_errors.value,
+        "mp_calls_per_unique_payment": round(mp_calls.value / max(1, args.unique), 3),
+        # Cada 500 simulado (--mp-error-rate) se reintenta desde la cola y suma una llamada:
+        # sin contar esos errores, el valor esperado es 1.0 (una consulta por pago).
+        "mp_successful_calls_per_unique_payment": round((mp_calls.value - mp_errors.value) / max(1, args.unique), 3),
+        "pipeline": webhook_main.pipeline.stats(),
+        "job_queue": queue_stats,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    return 0 if missing == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
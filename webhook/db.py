@@ -0,0 +1,65 @@
+import logging
+import threading
+
+from decouple import config
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "login_logs"
+
+# --- Configuración del pool (variables de entorno / .env) ---
+MONGO_OPTIONS = {
+    "maxPoolSize": config("MONGO_MAX_POOL_SIZE", default=20, cast=int),
+    "minPoolSize": config("MONGO_MIN_POOL_SIZE", default=0, cast=int),
+    "maxIdleTimeMS": config("MONGO_MAX_IDLE_TIME_MS", default=60000, cast=int),
+    "serverSelectionTimeoutMS": config("MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int),
+    "connectTimeoutMS": config("MONGO_CONNECT_TIMEOUT_MS", default=5000, cast=int),
+    "socketTimeoutMS": config("MONGO_SOCKET_TIMEOUT_MS", default=10000, cast=int),
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def ensure_indexes(db):
+    """Crea (si no existen) los índices que usan el webhook y la app de Streamlit."""
+    index_specs = [
+        (db.suscripciones, [("user_email", ASCENDING)], {"name": "user_email_unique", "unique": True}),
+        (db.suscripciones, [("updated_at", ASCENDING)], {"name": "updated_at"}),
+        (db.saas_dbvideo, [("timestamp", DESCENDING)], {"name": "timestamp"}),
+    ]
+    for collection, keys, options in index_specs:
+        try:
+            collection.create_index(keys, **options)
+        except ConnectionFailure as e:
+            logger.error("No se pudieron crear los índices de MongoDB: %s", e)
+            return
+        except PyMongoError as e:
+            logger.error("No se pudo crear el índice %s en %s: %s", options["name"], collection.name, e)
+
+
+def get_client() -> MongoClient:
+    """Un único MongoClient por proceso (cada worker de uvicorn tiene el suyo)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = MongoClient(config("MONGO_URI"), **MONGO_OPTIONS)
+                ensure_indexes(client[DB_NAME])
+                _client = client
+    return _client
+
+
+def get_database():
+    return get_client()[DB_NAME]
+
+
+def close_client():
+    """Cierra el MongoClient del proceso (al apagar el servicio, con las operaciones ya terminadas)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,96 @@
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Estados de Mercado Pago que ya no cambian la decisión del webhook: una vez vistos, las
+# notificaciones repetidas del mismo pago se descartan sin volver a consultar la API.
+FINAL_STATUSES = frozenset({"approved", "rejected", "cancelled", "refunded", "charged_back"})
+
+# Si un worker murió con el pago "tomado", otro puede retomarlo pasado este tiempo.
+CLAIM_LEASE_SECONDS = 120
+# Los registros se borran solos (índice TTL); MP deja de reintentar mucho antes.
+LEDGER_TTL_DAYS = 30
+
+
+class RecentPayments:
+    """LRU en memoria de pagos ya resueltos por este proceso."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, payment_id):
+        with self._lock:
+            if payment_id in self._entries:
+                self._entries.move_to_end(payment_id)
+                return True
+            return False
+
+    def add(self, payment_id):
+        with self._lock:
+            self._entries[payment_id] = True
+            self._entries.move_to_end(payment_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class PaymentLedger:
+    """
+    Registro persistente de pagos procesados (colección 'pagos_procesados', _id = payment_id).
+    Insertar el documento es "tomar" el pago: el _id único garantiza que entre varios workers
+    de uvicorn solo uno consulta la API de MP por cada notificación repetida.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        try:
+            self.collection.create_index(
+                [("claimed_at", ASCENDING)], name="claimed_at_ttl",
+                expireAfterSeconds=LEDGER_TTL_DAYS * 24 * 3600,
+            )
+        except PyMongoError as e:
+            logger.error("No se pudo crear el índice TTL de pagos procesados: %s", e)
+
+    def claim(self, payment_id: str) -> bool:
+        """True si este proceso debe procesar el pago; False si ya está resuelto o en curso."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            self.collection.insert_one({"_id": payment_id, "state": "processing", "claimed_at": now})
+            return True
+        except DuplicateKeyError:
+            pass
+        # Ya existe: solo se retoma si quedó "processing" con el lease vencido.
+        expired = self.collection.find_one_and_update(
+            {"_id": payment_id, "state": "processing",
+             "claimed_at": {"$lt": now - datetime.timedelta(seconds=CLAIM_LEASE_SECONDS)}},
+            {"$set": {"claimed_at": now}},
+        )
+        return expired is not None
+
+    def is_final(self, payment_id: str) -> bool:
+        doc = self.collection.find_one({"_id": payment_id}, {"state": 1})
+        return bool(doc) and doc.get("state") == "done"
+
+    def complete(self, payment_id: str, payment_status):
+        """Marca el pago como resuelto, o libera el registro si el estado todavía puede cambiar."""
+        if payment_status in FINAL_STATUSES:
+            self.collection.update_one(
+                {"_id": payment_id},
+                {"$set": {"state": "done", "payment_status": payment_status,
+                          "processed_at": datetime.datetime.now(datetime.timezone.utc)}},
+            )
+        else:
+            # pending / in_process: MP volverá a notificar cuando cambie, hay que volver a consultarlo.
+            self.release(payment_id)
+
+    def release(self, payment_id: str):
+        self.collection.delete_one({"_id": payment_id, "state": "processing"})
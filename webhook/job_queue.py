@@ -0,0 +1,139 @@
+import random
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payment_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payment_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending | running | done | dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_payment_jobs_ready ON payment_jobs (state, next_run_at);
+-- Un solo trabajo vivo por pago: los reintentos de MP no duplican la cola.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_jobs_live
+    ON payment_jobs (payment_id) WHERE state IN ('pending', 'running');
+"""
+
+
+class DurableJobQueue:
+    """
+    Cola de trabajos de pago persistida en SQLite. El endpoint escribe acá antes de responder
+    200, así un reinicio del proceso no pierde notificaciones. Los fallos se reintentan con
+    backoff exponencial y, agotados los intentos, quedan en estado 'dead' para revisión.
+
+    El archivo se puede compartir entre workers de uvicorn: la toma de trabajos usa una
+    transacción IMMEDIATE, que SQLite serializa entre procesos.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 8, base_backoff: float = 2.0, max_backoff: float = 900.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def enqueue(self, payment_id: str) -> bool:
+        """Persiste el trabajo. False si ya había uno pendiente para ese pago."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO payment_jobs (payment_id, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (payment_id, now, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def claim_batch(self, limit: int) -> list:
+        """Toma hasta `limit` trabajos listos y los pasa a 'running'. Devuelve [(id, payment_id, attempts, created_at)]."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payment_id, attempts, created_at FROM payment_jobs "
+                    "WHERE state = 'pending' AND next_run_at <= ? ORDER BY next_run_at LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE payment_jobs SET state = 'running', updated_at = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def complete(self, job_ids: list):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE payment_jobs SET state = 'done', updated_at = ? WHERE id = ?",
+                [(now, job_id) for job_id in job_ids],
+            )
+
+    def retry(self, job_id: int, attempts: int, error: str) -> str:
+        """Reprograma el trabajo con backoff exponencial (con jitter) o lo manda a 'dead'."""
+        attempts += 1
+        now = time.time()
+        if attempts >= self.max_attempts:
+            state, next_run_at = "dead", now
+        else:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+            state, next_run_at = "pending", now + delay * random.uniform(0.8, 1.2)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE payment_jobs SET state = ?, attempts = ?, next_run_at = ?, updated_at = ?, last_error = ? "
+                "WHERE id = ?",
+                (state, attempts, next_run_at, now, error[:1000], job_id),
+            )
+        return state
+
+    def recover_running(self, older_than: float = 0.0) -> int:
+        """Devuelve a 'pending' los trabajos que quedaron 'running' (proceso caído a mitad de lote)."""
+        cutoff = time.time() - older_than
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE payment_jobs SET state = 'pending', next_run_at = ? WHERE state = 'running' AND updated_at <= ?",
+                (time.time(), cutoff),
+            )
+        return cursor.rowcount
+
+    def next_ready_in(self):
+        """Segundos hasta el próximo trabajo pendiente, o None si no hay."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_run_at) FROM payment_jobs WHERE state = 'pending'"
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def purge_done(self, older_than_seconds: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM payment_jobs WHERE state = 'done' AND updated_at < ?",
+                (time.time() - older_than_seconds,),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM payment_jobs GROUP BY state").fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "dead": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,144 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import zlib
+
+from decouple import config
+
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+LOG_QUEUE_SIZE = config("LOG_QUEUE_SIZE", default=10000, cast=int) # Registros en espera antes de descartar
+LOG_STEP_SAMPLE_RATE = config("LOG_STEP_SAMPLE_RATE", default=1.0, cast=float) # Fracción de pagos con traza paso a paso
+LOG_PAYLOAD_MAX_CHARS = config("LOG_PAYLOAD_MAX_CHARS", default=512, cast=int)
+
+# Atributos estándar de LogRecord: todo lo demás llegó por `extra=` y va al JSON.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+class _Truncated:
+    """Payload que se serializa y recorta recién al formatear el registro (hilo del listener)."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit=None):
+        self.value = value
+        self.limit = LOG_PAYLOAD_MAX_CHARS if limit is None else limit
+
+    def __str__(self):
+        value = self.value
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}…(+{len(text) - self.limit} caracteres)"
+
+
+def truncate(value, limit=None):
+    """Argumento de log acotado para payloads: `logger.info("Body: %s", truncate(body))`."""
+    return _Truncated(value, limit)
+
+
+def step(payment_id) -> dict:
+    """`extra` para las líneas de detalle por pago; se muestrean con LOG_STEP_SAMPLE_RATE."""
+    return {"step": True, "payment_id": str(payment_id)}
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea. El mensaje se formatea recién aquí, en el hilo del listener."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != "step":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StepSampler(logging.Filter):
+    """
+    Deja pasar solo una fracción de las líneas marcadas con `step`. La decisión depende del
+    payment_id, así que de cada pago se ve la traza completa o nada. WARNING o más pasa siempre.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.threshold = int(max(0.0, min(1.0, rate)) * 0xFFFFFFFF)
+
+    def filter(self, record):
+        if not getattr(record, "step", False) or record.levelno >= logging.WARNING:
+            return True
+        key = str(getattr(record, "payment_id", "")).encode()
+        return zlib.crc32(key) <= self.threshold
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloquea: con la cola llena descarta el registro y lo cuenta."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Sin formatear: el mensaje y el JSON se arman en el hilo del listener.
+        return record
+
+
+def setup_logging():
+    """
+    Configura el logging del servicio: los handlers del event loop solo encolan y un hilo
+    (QueueListener) escribe JSON en stdout. Idempotente; devuelve el listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    handler.addFilter(StepSampler(LOG_STEP_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    # uvicorn configura sus propios handlers síncronos: se redirigen a la misma cola.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    # httpx loguea cada request a MP en INFO; ya queda medido en /metrics.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el hilo del listener (al cerrar la app)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    handler = next((h for h in logging.getLogger().handlers if isinstance(h, DroppingQueueHandler)), None)
+    return handler.dropped if handler else 0
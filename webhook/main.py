@@ -1,108 +1,261 @@
-
+import asyncio
 import datetime
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from pymongo import MongoClient
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException, Response
 from decouple import config
-import mercadopago
 import logging
+import time
+
+import metrics
+from logging_setup import setup_logging, step, truncate
+from db import close_client, get_database
+from idempotency import FINAL_STATUSES, PaymentLedger, RecentPayments
+from job_queue import DurableJobQueue
+from mp_client import DEFAULT_API_URL, MercadoPagoClient
+from pipeline import PaymentOutcome, PaymentPipeline
+from pymongo import UpdateOne
 
 # --- Configuración de Logging ---
-logging.basicConfig(level=logging.INFO)
+# Registros JSON encolados: el event loop nunca escribe en stdout (ver logging_setup.py).
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# --- Inicialización de la App FastAPI ---
-app = FastAPI()
+# --- Configuración del procesamiento asíncrono ---
+MERCADOPAGO_API_URL = config("MERCADOPAGO_API_URL", default=DEFAULT_API_URL)
+MP_MAX_CONCURRENCY = config("MP_MAX_CONCURRENCY", default=32, cast=int) # Consultas simultáneas a MP
+PAYMENT_BATCH_SIZE = config("PAYMENT_BATCH_SIZE", default=50, cast=int) # Pagos tomados de la cola por lote
+JOB_QUEUE_PATH = config("JOB_QUEUE_PATH", default="payment_jobs.sqlite3") # Cola durable (SQLite)
+JOB_MAX_ATTEMPTS = config("JOB_MAX_ATTEMPTS", default=8, cast=int) # Intentos antes de dead-letter
+MONGO_EXECUTOR_WORKERS = config("MONGO_EXECUTOR_WORKERS", default=8, cast=int) # Hilos dedicados a pymongo
+SHUTDOWN_DRAIN_SECONDS = config("SHUTDOWN_DRAIN_SECONDS", default=25, cast=float)
+JOB_DONE_RETENTION_HOURS = config("JOB_DONE_RETENTION_HOURS", default=72, cast=float) # Historial de trabajos terminados
+QUEUE_MAINTENANCE_SECONDS = config("QUEUE_MAINTENANCE_SECONDS", default=60, cast=float) # Recuperación y limpieza de la cola
 
 # --- Configuración de Clientes ---
 try:
-    MONGO_URI = config("MONGO_URI")
     MERCADOPAGO_ACCESS_TOKEN = config("MERCADOPAGO_ACCESS_TOKEN")
-    
-    client = MongoClient(MONGO_URI)
-    db = client.login_logs
+
+    db = get_database() # Cliente con pool y timeouts explícitos (db.py)
     suscripciones_collection = db.suscripciones
-    
-    sdk = mercadopago.SDK(MERCADOPAGO_ACCESS_TOKEN)
-    logger.info("Clientes de MongoDB y Mercado Pago inicializados correctamente.")
+    payment_ledger = PaymentLedger(db.pagos_procesados) # Registro de pagos ya procesados (idempotencia)
+    payment_ledger.ensure_indexes()
+    logger.info("Cliente de MongoDB inicializado correctamente.")
 except Exception as e:
-    logger.error(f"Error CRÍTICO al inicializar los clientes: {e}", exc_info=True)
+    logger.error("Error CRÍTICO al inicializar los clientes: %s", e, exc_info=True)
     raise
 
-def process_payment(payment_id: str):
+# pymongo es bloqueante: corre en un pool de hilos propio para no frenar el event loop.
+mongo_executor = ThreadPoolExecutor(MONGO_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+# SQLite admite un solo escritor: un hilo dedicado serializa las operaciones de la cola.
+queue_executor = ThreadPoolExecutor(1, thread_name_prefix="job-queue")
+job_queue = DurableJobQueue(JOB_QUEUE_PATH, max_attempts=JOB_MAX_ATTEMPTS)
+mp_client = None # Se crea en el lifespan, dentro del event loop
+
+# Pagos ya resueltos por este proceso: los reintentos de MP se descartan sin tocar Mongo ni la API.
+recent_payments = RecentPayments()
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(mongo_executor, functools.partial(fn, *args, **kwargs))
+
+async def run_queue(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(queue_executor, functools.partial(fn, *args, **kwargs))
+
+def activation_update(user_email: str, payment_id: str) -> UpdateOne:
+    return UpdateOne(
+        {"user_email": user_email},
+        {
+            "$set": {
+                "status": "active",
+                "payment_date": datetime.datetime.now(),
+                "source": "mercadopago_webhook",
+                "last_payment_id": payment_id
+            },
+            # Hora del servidor de Mongo: la app la usa para refrescar su caché de suscripciones
+            "$currentDate": {"updated_at": True},
+            "$setOnInsert": {
+                "user_email": user_email,
+                "signup_date": datetime.datetime.now()
+            }
+        },
+        upsert=True
+    )
+
+async def resolve_payment(payment_id: str) -> PaymentOutcome:
     """
-    Esta función se ejecuta en segundo plano para procesar el pago.
+    Consulta un pago tomado de la cola y decide qué hacer con él (sin escribir la suscripción).
+    Es idempotente: cada pago se consulta a MP una sola vez aunque llegue repetido.
     """
-    logger.info(f"[BG_TASK] Iniciando procesamiento para el pago ID: {payment_id}")
+    if payment_id in recent_payments:
+        logger.info("[BG_TASK] Pago %s ya procesado por este worker. Notificación duplicada ignorada.", payment_id, extra=step(payment_id))
+        return PaymentOutcome("done", payment_id)
+    try:
+        if not await run_db(payment_ledger.claim, payment_id):
+            if await run_db(payment_ledger.is_final, payment_id):
+                recent_payments.add(payment_id)
+                logger.info("[BG_TASK] Pago %s ya procesado. Notificación duplicada ignorada.", payment_id, extra=step(payment_id))
+                return PaymentOutcome("done", payment_id)
+            # Otro worker lo tiene en curso: se reintenta más tarde por si ese worker falla.
+            return PaymentOutcome("retry", payment_id, error="pago en curso en otro worker")
+    except Exception as e:
+        # Sin registro persistente se procesa igual: mejor una consulta de más que un pago perdido.
+        logger.error("[BG_TASK] No se pudo registrar el pago %s en el ledger: %s", payment_id, e)
+
+    logger.info("[BG_TASK] Iniciando procesamiento para el pago ID: %s", payment_id, extra=step(payment_id))
     try:
-        logger.info(f"[BG_TASK] Obteniendo detalles del pago desde la API de Mercado Pago...")
-        payment_info = sdk.payment().get(payment_id)
-        payment = payment_info.get("response")
-        logger.info(f"[BG_TASK] Respuesta de la API de MP recibida.")
+        logger.info("[BG_TASK] Obteniendo detalles del pago desde la API de Mercado Pago...", extra=step(payment_id))
+        started = time.perf_counter()
+        try:
+            payment = await mp_client.get_payment(payment_id)
+        finally:
+            metrics.MP_FETCH_SECONDS.observe(time.perf_counter() - started)
+        logger.info("[BG_TASK] Respuesta de la API de MP recibida.", extra=step(payment_id))
 
         if not payment:
-            logger.error(f"[BG_TASK] No se pudo obtener información para el pago ID: {payment_id}")
-            return
+            # MP a veces notifica antes de que el pago sea consultable: se reintenta con backoff.
+            logger.error("[BG_TASK] No se pudo obtener información para el pago ID: %s", payment_id)
+            metrics.PAYMENTS.labels(status="not_found").inc()
+            await _release_claim(payment_id)
+            return PaymentOutcome("retry", payment_id, error="pago no encontrado en MP")
 
         payment_status = payment.get("status")
-        logger.info(f"[BG_TASK] El estado del pago es: {payment_status}")
+        metrics.PAYMENTS.labels(status=payment_status or "unknown").inc()
+        logger.info("[BG_TASK] El estado del pago es: %s", payment_status, extra=step(payment_id))
 
         if payment_status == "approved":
-            user_email = payment.get("payer", {}).get("email")
-            logger.info(f"[BG_TASK] Email del pagador: {user_email}")
+            user_email = (payment.get("payer") or {}).get("email")
+            logger.info("[BG_TASK] Email del pagador: %s", user_email, extra=step(payment_id))
 
             if not user_email:
-                logger.error(f"[BG_TASK] Pago {payment_id} aprobado pero sin email del pagador.")
-                return
-
-            logger.info(f"[BG_TASK] Intentando actualizar la base de datos para {user_email}...")
-            suscripciones_collection.update_one(
-                {"user_email": user_email},
-                {
-                    "$set": {
-                        "status": "active",
-                        "payment_date": datetime.datetime.now(),
-                        "source": "mercadopago_webhook",
-                        "last_payment_id": payment_id
-                    },
-                    "$setOnInsert": {
-                        "user_email": user_email,
-                        "signup_date": datetime.datetime.now()
-                    }
-                },
-                upsert=True
-            )
-            logger.info(f"[BG_TASK] ¡ÉXITO! Base de datos actualizada para {user_email}.")
-        else:
-            logger.info(f"[BG_TASK] El pago no está aprobado. No se realiza ninguna acción.")
+                logger.error("[BG_TASK] Pago %s aprobado pero sin email del pagador.", payment_id)
+                metrics.ERRORS.labels(stage="resolve", error_type="MissingPayerEmail").inc()
+                await _finish_claim(payment_id, payment_status)
+                return PaymentOutcome("done", payment_id, payment_status)
+            return PaymentOutcome("activate", payment_id, payment_status, user_email)
+
+        logger.info("[BG_TASK] El pago no está aprobado. No se realiza ninguna acción.", extra=step(payment_id))
+        await _finish_claim(payment_id, payment_status)
+        return PaymentOutcome("done", payment_id, payment_status)
+
+    except Exception as e:
+        logger.error("[BG_TASK] EXCEPCIÓN DETALLADA durante el procesamiento del pago %s: %s", payment_id, e, exc_info=True)
+        metrics.record_error("resolve", e)
+        # Se libera para que el reintento de la cola lo vuelva a procesar.
+        await _release_claim(payment_id)
+        return PaymentOutcome("retry", payment_id, error=repr(e))
 
+async def commit_outcomes(outcomes: list):
+    """Escribe todas las activaciones del lote con un único bulk_write."""
+    activations = [o for o in outcomes if o.action == "activate"]
+    if not activations:
+        return
+    logger.info("[BG_TASK] Intentando actualizar la base de datos para %d pagos aprobados...", len(activations))
+    started = time.perf_counter()
+    try:
+        await run_db(
+            suscripciones_collection.bulk_write,
+            [activation_update(o.user_email, o.payment_id) for o in activations],
+            ordered=False,
+        )
+    except Exception as e:
+        metrics.record_error("mongo_upsert", e)
+        for outcome in activations:
+            await _release_claim(outcome.payment_id)
+        raise
+    finally:
+        metrics.MONGO_WRITE_SECONDS.observe(time.perf_counter() - started)
+    logger.info("[BG_TASK] ¡ÉXITO! Base de datos actualizada para %d suscripciones.", len(activations))
+    for outcome in activations:
+        await _finish_claim(outcome.payment_id, outcome.payment_status)
+
+async def _finish_claim(payment_id: str, payment_status):
+    try:
+        await run_db(payment_ledger.complete, payment_id, payment_status)
     except Exception as e:
-        logger.error(f"[BG_TASK] EXCEPCIÓN DETALLADA durante el procesamiento del pago: {e}", exc_info=True)
+        logger.error("[BG_TASK] No se pudo marcar el pago %s como procesado: %s", payment_id, e)
+    if payment_status in FINAL_STATUSES:
+        recent_payments.add(payment_id)
+
+async def _release_claim(payment_id: str):
+    try:
+        await run_db(payment_ledger.release, payment_id)
+    except Exception as e:
+        logger.error("[BG_TASK] No se pudo liberar el pago %s: %s", payment_id, e)
+
+
+pipeline = PaymentPipeline(
+    job_queue, resolve_payment, commit_outcomes, run_queue,
+    batch_size=PAYMENT_BATCH_SIZE,
+    maintenance_interval=QUEUE_MAINTENANCE_SECONDS,
+    done_retention=JOB_DONE_RETENTION_HOURS * 3600,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global mp_client
+    mp_client = MercadoPagoClient(
+        MERCADOPAGO_ACCESS_TOKEN, base_url=MERCADOPAGO_API_URL, max_concurrency=MP_MAX_CONCURRENCY
+    )
+    pipeline.start()
+    logger.info("Pipeline de pagos iniciado (cola durable en %s).", JOB_QUEUE_PATH)
+    yield
+    # Cierre ordenado: se termina el lote en curso; lo pendiente queda en disco para el próximo arranque.
+    await pipeline.drain(SHUTDOWN_DRAIN_SECONDS)
+    await mp_client.aclose()
+    mongo_executor.shutdown(wait=True)
+    close_client() # Sin hilos de Mongo pendientes: ya se puede cerrar el pool de conexiones
+    queue_executor.submit(job_queue.close).result()
+    queue_executor.shutdown(wait=True)
+    logger.info("Pipeline de pagos detenido: %s", pipeline.stats())
+
+
+# --- Inicialización de la App FastAPI ---
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/webhook/mercadopago")
-async def mercadopago_webhook(request: Request, background_tasks: BackgroundTasks):
+async def mercadopago_webhook(request: Request):
     """
     Endpoint para recibir notificaciones de Webhook de Mercado Pago.
-    Responde inmediatamente y procesa el pago en segundo plano.
+    Guarda el pago en la cola durable, responde inmediatamente y lo procesa en segundo plano.
     """
     try:
         body = await request.json()
-        logger.info(f"Webhook recibido: {body}")
+        payment_id = (body.get("data") or {}).get("id")
+        logger.info("Webhook recibido: %s", truncate(body), extra=step(payment_id))
 
         if body.get("type") == "payment":
-            payment_id = body.get("data", {}).get("id")
+            if payment_id and str(payment_id) in recent_payments:
+                logger.info("Pago %s ya procesado. Respondiendo 200 OK sin reprocesar.", payment_id, extra=step(payment_id))
+                metrics.NOTIFICATIONS.labels(result="duplicate").inc()
+                return {"status": "notification received"}
             if payment_id:
-                background_tasks.add_task(process_payment, payment_id)
-                logger.info(f"Pago {payment_id} encolado para procesamiento. Respondiendo 200 OK a Mercado Pago.")
+                # Se persiste antes de responder: si el proceso se reinicia, el pago no se pierde.
+                await run_queue(job_queue.enqueue, str(payment_id))
+                pipeline.notify()
+                metrics.NOTIFICATIONS.labels(result="queued").inc()
+                logger.info("Pago %s encolado para procesamiento. Respondiendo 200 OK a Mercado Pago.", payment_id, extra=step(payment_id))
                 return {"status": "notification received"}
         
         logger.warning("Notificación ignorada (no es de tipo 'payment' o no tiene ID).")
+        metrics.NOTIFICATIONS.labels(result="ignored").inc()
         return {"status": "notification ignored"}
 
     except Exception as e:
-        logger.error(f"Error en el endpoint principal del webhook antes de procesar: {e}", exc_info=True)
+        logger.error("Error en el endpoint principal del webhook antes de procesar: %s", e, exc_info=True)
+        metrics.NOTIFICATIONS.labels(result="error").inc()
+        metrics.record_error("endpoint", e)
         raise HTTPException(status_code=500, detail="Error interno en el servidor de webhooks.")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métricas en formato de texto de Prometheus."""
+    job_stats = await run_queue(job_queue.stats)
+    return Response(metrics.render(job_stats), media_type=metrics.CONTENT_TYPE_LATEST)
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
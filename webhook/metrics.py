@@ -0,0 +1,37 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from logging_setup import dropped_records
+
+# Nota: cada worker de uvicorn expone sus propias métricas (registro por proceso).
+
+NOTIFICATIONS = Counter(
+    "webhook_notifications_total", "Notificaciones recibidas en /webhook/mercadopago, por resultado.", ["result"]
+)
+MP_FETCH_SECONDS = Histogram(
+    "webhook_mp_fetch_seconds", "Latencia de GET /v1/payments/{id} contra Mercado Pago.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+MONGO_WRITE_SECONDS = Histogram(
+    "webhook_mongo_upsert_seconds", "Latencia del bulk_write de activaciones en Mongo.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+ACTIVATION_LAG_SECONDS = Histogram(
+    "webhook_activation_lag_seconds", "Tiempo desde la recepción de la notificación hasta la activación.",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+PAYMENTS = Counter("webhook_payments_total", "Pagos consultados en MP, por estado devuelto.", ["status"])
+ERRORS = Counter("webhook_errors_total", "Errores de procesamiento, por etapa y tipo.", ["stage", "error_type"])
+JOBS = Gauge("webhook_jobs", "Trabajos en la cola durable, por estado.", ["state"])
+LOG_DROPPED = Gauge("webhook_log_records_dropped", "Registros de log descartados por cola de logging llena.")
+
+
+def record_error(stage: str, error: BaseException):
+    ERRORS.labels(stage=stage, error_type=type(error).__name__).inc()
+
+
+def render(job_stats: dict) -> bytes:
+    """Texto en formato Prometheus; las métricas de la cola se leen al momento del scrape."""
+    for state, count in job_stats.items():
+        JOBS.labels(state=state).set(count)
+    LOG_DROPPED.set(dropped_records())
+    return generate_latest()
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Optional
+
+import httpx
+
+DEFAULT_API_URL = "https://api.mercadopago.com"
+
+
+class MercadoPagoClient:
+    """
+    Cliente asíncrono mínimo para la API de pagos de Mercado Pago.
+    Reutiliza conexiones (keep-alive) y limita cuántas consultas hay en vuelo a la vez.
+    """
+
+    def __init__(self, access_token: str, base_url: str = DEFAULT_API_URL, max_concurrency: int = 32,
+                 timeout: float = 10.0):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def get_payment(self, payment_id: str) -> Optional[dict]:
+        """Devuelve el pago, o None si MP no lo conoce. Los errores transitorios se propagan."""
+        async with self._semaphore:
+            response = await self._client.get(f"/v1/payments/{payment_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import NamedTuple, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentOutcome(NamedTuple):
+    """Resultado de consultar un pago. action: 'activate' | 'done' | 'retry'."""
+    action: str
+    payment_id: str
+    payment_status: Optional[str] = None
+    user_email: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PaymentPipeline:
+    """
+    Consume la cola durable en lotes: toma trabajos listos, resuelve los pagos en paralelo
+    (`resolve`) y confirma el lote de una vez (`commit`, que agrupa las activaciones en un
+    solo bulk_write). Los trabajos fallidos vuelven a la cola con backoff.
+    """
+
+    def __init__(self, job_queue, resolve, commit, run_blocking, batch_size: int = 50,
+                 poll_interval: float = 5.0, orphan_after: float = 300.0,
+                 maintenance_interval: float = 60.0, done_retention: float = 72 * 3600):
+        self.job_queue = job_queue
+        self.resolve = resolve
+        self.commit = commit
+        self.run_blocking = run_blocking # Ejecuta las operaciones de SQLite fuera del event loop
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.orphan_after = orphan_after
+        self.maintenance_interval = maintenance_interval
+        self.done_retention = done_retention # Segundos que se conservan los trabajos 'done'
+        self._last_maintenance = float("-inf")
+        self._wake = None
+        self._task = None
+        self._stopping = False
+        self.processed = 0
+        self.retried = 0
+        self.dead = 0
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch(), name="payment-dispatcher")
+
+    def notify(self):
+        """Despierta al despachador cuando el endpoint encoló un trabajo nuevo."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _maintain(self):
+        """Cada `maintenance_interval`: recupera trabajos huérfanos y borra los 'done' viejos."""
+        now = time.monotonic()
+        if now - self._last_maintenance < self.maintenance_interval:
+            return
+        self._last_maintenance = now
+        # Trabajos "running" de un proceso que murió vuelven a estar disponibles.
+        await self.run_blocking(self.job_queue.recover_running, self.orphan_after)
+        purged = await self.run_blocking(self.job_queue.purge_done, self.done_retention)
+        if purged:
+            logger.info("Cola de pagos: %d trabajos terminados eliminados.", purged)
+
+    async def _dispatch(self):
+        while not self._stopping:
+            # Se limpia antes de buscar trabajos: un notify() que llegue durante claim_batch
+            # deja el evento activo y el próximo wait no se duerme.
+            self._wake.clear()
+            try:
+                await self._maintain()
+                rows = await self.run_blocking(self.job_queue.claim_batch, self.batch_size)
+                if rows:
+                    await self._process_batch(rows)
+                    continue
+                next_ready = await self.run_blocking(self.job_queue.next_ready_in)
+            except Exception as e:
+                logger.error("Error en el despachador de pagos: %s", e, exc_info=True)
+                next_ready = None
+            timeout = self.poll_interval if next_ready is None else min(self.poll_interval, next_ready)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process_batch(self, rows):
+        results = await asyncio.gather(*(self.resolve(row[1]) for row in rows), return_exceptions=True)
+        outcomes = []
+        for row, result in zip(rows, results):
+            if isinstance(result, BaseException):
+                metrics.record_error("resolve", result)
+                result = PaymentOutcome("retry", row[1], error=repr(result))
+            outcomes.append(result)
+
+        try:
+            await self.commit(outcomes)
+        except Exception as e:
+            metrics.record_error("commit", e)
+            logger.error("Error al confirmar el lote de %d pagos: %s", len(outcomes), e, exc_info=True)
+            outcomes = [
+                o._replace(action="retry", error=repr(e)) if o.action == "activate" else o for o in outcomes
+            ]
+
+        now = time.time()
+        done_ids = []
+        for row, outcome in zip(rows, outcomes):
+            if outcome.action == "activate":
+                metrics.ACTIVATION_LAG_SECONDS.observe(now - row[3]) # row[3]: recepción (created_at)
+            if outcome.action == "retry":
+                state = await self.run_blocking(self.job_queue.retry, row[0], row[2], outcome.error or "")
+                if state == "dead":
+                    self.dead += 1
+                    metrics.ERRORS.labels(stage="queue", error_type="DeadLetter").inc()
+                    logger.error(
+                        "Pago %s enviado a dead-letter tras %d intentos: %s", outcome.payment_id, row[2] + 1, outcome.error
+                    )
+                else:
+                    self.retried += 1
+            else:
+                done_ids.append(row[0])
+        if done_ids:
+            await self.run_blocking(self.job_queue.complete, done_ids)
+            self.processed += len(done_ids)
+
+    async def drain(self, timeout: float = 30.0):
+        """Termina el lote en curso y detiene el despachador. Lo pendiente queda en disco."""
+        self._stopping = True
+        self.notify()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error("El lote en curso no terminó en %ss; se retomará al reiniciar.", timeout)
+
+    def stats(self) -> dict:
+        return {"processed": self.processed, "retried": self.retried, "dead": self.dead}
@@ -0,0 +1,88 @@
+"""
+Ráfaga de notificaciones duplicadas contra un doble local de la API de pagos de MP: cada
+pago tiene que consultarse una sola vez. Sin red (mongomock + el doble de benchmark.py).
+
+    cd webhook
+    pip install -r requirements-dev.txt
+    python -m pytest -q test_idempotency.py
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from benchmark import free_port, run_fake_mp_api, wait_for_port  # noqa: E402
+
+UNIQUE_PAYMENTS = 20
+DUPLICATES_PER_PAYMENT = 10
+
+
+@pytest.fixture(scope="module")
+def webhook_env():
+    ctx = multiprocessing.get_context("spawn")
+    calls, errors = ctx.Value("i", 0), ctx.Value("i", 0)
+    mp_port = free_port()
+    mp_process = ctx.Process(target=run_fake_mp_api, args=(mp_port, 20.0, 5.0, 0.0, 1.0, calls, errors), daemon=True)
+    mp_process.start()
+    wait_for_port(mp_port)
+
+    # main.py lee la configuración al importarse
+    os.environ.update({
+        "MONGO_URI": "mongodb://test.invalid",
+        "MERCADOPAGO_ACCESS_TOKEN": "test-token",
+        "MERCADOPAGO_API_URL": f"http://127.0.0.1:{mp_port}",
+        "JOB_QUEUE_PATH": os.path.join(tempfile.mkdtemp(prefix="webhook-test-"), "payment_jobs.sqlite3"),
+    })
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+    import main as webhook_main
+
+    yield webhook_main, calls
+    mp_process.terminate()
+
+
+def test_duplicate_burst_calls_mp_once_per_payment(webhook_env):
+    from fastapi.testclient import TestClient
+
+    webhook_main, calls = webhook_env
+    payment_ids = [str(2_000_000 + i) for i in range(UNIQUE_PAYMENTS)]
+    burst = [pid for pid in payment_ids for _ in range(DUPLICATES_PER_PAYMENT)]
+
+    with TestClient(webhook_main.app) as client:
+        def post(payment_id):
+            return client.post("/webhook/mercadopago", json={"type": "payment", "data": {"id": payment_id}}).status_code
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            status_codes = list(pool.map(post, burst))
+        assert status_codes == [200] * len(burst)
+
+        # Se espera a que el pipeline active todas las suscripciones (el doble aprueba todo)
+        emails = [f"user{pid}@bench.local" for pid in payment_ids]
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            active = webhook_main.suscripciones_collection.count_documents({"user_email": {"$in": emails}, "status": "active"})
+            if active == UNIQUE_PAYMENTS:
+                break
+            time.sleep(0.05)
+        assert active == UNIQUE_PAYMENTS
+
+        # Segunda ráfaga como si llegara a otro worker (LRU vacía): la encola, pero el ledger
+        # en Mongo la descarta sin volver a consultar MP.
+        webhook_main.recent_payments._entries.clear()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(post, burst))
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and webhook_main.pipeline.processed < 2 * UNIQUE_PAYMENTS:
+            time.sleep(0.05)
+        assert webhook_main.pipeline.processed >= 2 * UNIQUE_PAYMENTS
+
+    assert calls.value == UNIQUE_PAYMENTS